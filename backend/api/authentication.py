@@ -0,0 +1,142 @@
+import hashlib
+import threading
+import time
+import types
+from collections import OrderedDict
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.utils.translation import gettext_lazy as _
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.authtoken.models import Token
+
+from foodgram.settings import TOKEN_CACHE
+from users.models import User
+
+# В кеше только id и флаги для проверок доступа: ни хеша пароля,
+# ни почты. Остальные поля отложены и загружаются из базы при первом
+# обращении. from_db ждёт поля в порядке модели.
+CACHED_FIELDS = tuple(
+    field.attname for field in User._meta.concrete_fields
+    if field.attname in ('id', 'is_active', 'is_staff')
+)
+
+
+def load_deferred(user, using=None, fields=None):
+    """refresh_from_db пользователя из кеша: первое обращение
+    к отложенному полю загружает все отложенные поля одним запросом.
+    Счётчики загружаются, только если запрошены, чтобы save() их
+    не затёр."""
+    if fields is not None:
+        fields = set(fields) | (
+            user.get_deferred_fields() - set(User.COUNTER_FIELDS)
+        )
+    User.refresh_from_db(user, using, fields)
+
+
+def cached_user(values):
+    user = User.from_db(DEFAULT_DB_ALIAS, CACHED_FIELDS, values)
+    user.refresh_from_db = types.MethodType(load_deferred, user)
+    return user
+
+
+class LRUCache:
+    """Ограниченный по размеру кеш в памяти процесса со сроком жизни
+    записей."""
+
+    def __init__(self, size, timeout):
+        self.size = size
+        self.timeout = timeout
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        if self.size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (time.monotonic() + self.timeout, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.size:
+                self._entries.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+class TokenCache:
+    """Пользователь по токену: сначала кеш процесса, затем кеш Django.
+
+    Ключи кеша Django содержат хеш токена, а не сам токен. Удаление
+    действует сразу в этом процессе и в кеше Django, а в других
+    процессах — не позже чем через TOKEN_CACHE['LOCAL_TIMEOUT'].
+    """
+
+    def __init__(self, timeout, local_size, local_timeout):
+        self.timeout = timeout
+        self.local = LRUCache(local_size, local_timeout)
+
+    @staticmethod
+    def cache_key(key):
+        return 'auth-token:' + hashlib.sha256(key.encode()).hexdigest()
+
+    def get(self, key):
+        cache_key = self.cache_key(key)
+        values = self.local.get(cache_key)
+        if values is None:
+            values = cache.get(cache_key)
+            if values is None:
+                return None
+            self.local.set(cache_key, values)
+        return cached_user(values)
+
+    def set(self, key, user):
+        cache_key = self.cache_key(key)
+        values = tuple(getattr(user, field) for field in CACHED_FIELDS)
+        cache.set(cache_key, values, self.timeout)
+        self.local.set(cache_key, values)
+
+    def delete(self, *keys):
+        cache_keys = [self.cache_key(key) for key in keys]
+        cache.delete_many(cache_keys)
+        for cache_key in cache_keys:
+            self.local.delete(cache_key)
+
+
+token_cache = TokenCache(
+    TOKEN_CACHE['TIMEOUT'],
+    TOKEN_CACHE['LOCAL_SIZE'],
+    TOKEN_CACHE['LOCAL_TIMEOUT'],
+)
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """TokenAuthentication без запроса к базе для токенов из кеша.
+
+    is_active проверяется и для пользователя из кеша. Изменения,
+    прошедшие мимо post_save (например, update()), доходят до кеша
+    не позже чем через TOKEN_CACHE['TIMEOUT'].
+    """
+
+    def authenticate_credentials(self, key):
+        user = token_cache.get(key)
+        if user is None:
+            user, token = super().authenticate_credentials(key)
+            token_cache.set(key, user)
+            return user, token
+        if not user.is_active:
+            raise AuthenticationFailed(_('User inactive or deleted.'))
+        return user, Token(key=key, user=user)
@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, register
+
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """Версии в recipes.cache видны другим процессам только через общий кеш."""
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.REQUIRE_SHARED_CACHE and backend in PROCESS_LOCAL_CACHES:
+        return [Error(
+            f'Кеш {backend} свой у каждого процесса: сброс версий '
+            'не дойдёт до других процессов gunicorn и обработчиков.',
+            hint='Задайте CACHE_BACKEND и CACHE_LOCATION, например '
+                 'memcached, или REQUIRE_SHARED_CACHE=False для отладки.',
+            id='api.E001',
+        )]
+    return []
@@ -0,0 +1,62 @@
+from django.db.models import F
+
+from foodgram.settings import FEED_FANOUT_LIMIT
+from recipes.models import FeedEntry, Recipe
+from users.models import Subscribe
+
+BATCH_SIZE = 1000
+
+
+def fan_out(recipe):
+    """Добавляет рецепт в ленты подписчиков автора, если их
+    не больше FEED_FANOUT_LIMIT; иначе рецепт попадёт в ленты
+    при чтении."""
+    subscribers = Subscribe.objects.filter(
+        author_id=recipe.author_id,
+        author__subscribers_count__lte=FEED_FANOUT_LIMIT,
+    ).values_list('user_id', flat=True)
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe.pk,
+                   author_id=recipe.author_id, pub_date=recipe.pub_date)
+         for user_id in subscribers.iterator(chunk_size=BATCH_SIZE)),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту подписчика уже опубликованные рецепты автора."""
+    recipes = Recipe.objects.filter(
+        author_id=author_id,
+        author__subscribers_count__lte=FEED_FANOUT_LIMIT,
+    ).values_list('id', 'pub_date')
+    FeedEntry.objects.bulk_create(
+        (FeedEntry(user_id=user_id, recipe_id=recipe_id,
+                   author_id=author_id, pub_date=pub_date)
+         for recipe_id, pub_date in recipes.iterator(chunk_size=BATCH_SIZE)),
+        batch_size=BATCH_SIZE,
+        ignore_conflicts=True
+    )
+
+
+def prune(user_id, author_id):
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def feed_querysets(user):
+    """Источники ленты с общей сортировкой по feed_date: записи
+    ленты и рецепты авторов, у которых больше FEED_FANOUT_LIMIT
+    подписчиков."""
+    popular_authors = list(Subscribe.objects.filter(
+        user=user, author__subscribers_count__gt=FEED_FANOUT_LIMIT
+    ).values_list('author_id', flat=True))
+    querysets = [
+        Recipe.objects.filter(feed_entries__user=user).exclude(
+            author_id__in=popular_authors
+        ).annotate(feed_date=F('feed_entries__pub_date'))
+    ]
+    if popular_authors:
+        querysets.append(Recipe.objects.filter(
+            author_id__in=popular_authors
+        ).annotate(feed_date=F('pub_date')))
+    return querysets
@@ -1,7 +1,14 @@
+from django import forms
 from rest_framework.filters import SearchFilter
 from django_filters.rest_framework import filters, FilterSet
 
+from api.pagination import RankedQuerySet
 from recipes.models import Ingredient, Recipe, Tag
+from recipes.recipe_index import recipe_index
+
+
+class IntegerInFilter(filters.BaseInFilter):
+    field_class = forms.IntegerField
 
 
 class SearchIngredientFilter(SearchFilter):
@@ -22,6 +29,8 @@ class RecipeFilter(FilterSet):
     is_in_shopping_cart = filters.BooleanFilter(
         method='get_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='get_search')
+    ingredients = IntegerInFilter(method='get_ingredients')
 
     class Meta:
         model = Recipe
@@ -29,7 +38,9 @@ class RecipeFilter(FilterSet):
             'tags',
             'author',
             'is_favorited',
-            'is_in_shopping_cart'
+            'is_in_shopping_cart',
+            'search',
+            'ingredients',
         )
 
     def get_is_favorited(self, queryset, name, value):
@@ -43,3 +54,30 @@ class RecipeFilter(FilterSet):
         if value and user.is_authenticated:
             return queryset.filter(shoppingcart_recipe__user=user)
         return queryset
+
+    def get_search(self, queryset, name, value):
+        value = value.strip()
+        if value:
+            return queryset.search(value)
+        return queryset
+
+    def get_ingredients(self, queryset, name, value):
+        """Подбор по ингредиентам выполняется в filter_queryset."""
+        return queryset
+
+    def filter_queryset(self, queryset):
+        """Рецепты хотя бы с одним из ингредиентов ingredients и долей
+        ingredient_coverage своих ингредиентов, которые есть в запросе.
+
+        RankedQuerySet не QuerySet, поэтому оборачивает результат
+        остальных фильтров, а не возвращается из get_ingredients.
+        """
+        queryset = super().filter_queryset(queryset)
+        ingredient_ids = self.form.cleaned_data.get('ingredients')
+        if not ingredient_ids:
+            return queryset
+        return RankedQuerySet(queryset, {
+            recipe_id: found / total
+            for recipe_id, (found, total)
+            in recipe_index.coverage(ingredient_ids).items()
+        }, 'ingredient_coverage')
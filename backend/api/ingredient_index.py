@@ -0,0 +1,62 @@
+import json
+import threading
+from bisect import bisect_left
+
+from recipes.cache import get_version
+from recipes.models import Ingredient
+
+PREFIX_END = chr(0x10FFFF)
+
+
+class IngredientIndex:
+    """Индекс ингредиентов по префиксу названия в памяти процесса.
+
+    Строится при первом обращении и перестраивается, когда
+    меняется версия в кеше.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = ((), ())
+
+    def reset(self):
+        """Сбрасывает индекс: следующий поиск построит его заново."""
+        with self._lock:
+            self._version = None
+            self._entries = ((), ())
+
+    def _build(self, version):
+        rows = Ingredient.objects.values('id', 'name', 'measurement_unit')
+        entries = sorted(
+            (row['name'].casefold(), row['id'], row) for row in rows
+        )
+        self._entries = (
+            tuple(key for key, _, _ in entries),
+            tuple(json.dumps(row, ensure_ascii=False).encode()
+                  for _, _, row in entries),
+        )
+        self._version = version
+
+    def _ensure_built(self):
+        version = get_version(Ingredient._meta.label_lower)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._build(version)
+
+    def search(self, prefix):
+        """JSON-массив ингредиентов, название которых начинается
+        с prefix. Точные совпадения идут первыми; для пустого
+        prefix — пустой массив, а не весь справочник."""
+        prefix = prefix.strip().casefold()
+        if not prefix:
+            return b'[]'
+        self._ensure_built()
+        keys, payloads = self._entries
+        start = bisect_left(keys, prefix)
+        end = bisect_left(keys, prefix + PREFIX_END, start)
+        return b'[' + b','.join(payloads[start:end]) + b']'
+
+
+ingredient_index = IngredientIndex()
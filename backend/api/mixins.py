@@ -1,34 +1,184 @@
-from django.shortcuts import get_object_or_404
+from django.core.cache import cache
+from django.db import transaction
+from django.http import Http404, HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.utils.http import parse_etags
 from rest_framework import status
+from rest_framework.exceptions import ValidationError
 from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from recipes.models import Recipe
+from api.pagination import RecipeOrderingFilter
+from api.relations import (delete_relation, delete_relations,
+                           insert_relation, insert_relations,
+                           refresh_counter)
+from api.response_cache import (get_response, make_etag,
+                                recipe_dependencies, response_key,
+                                set_response)
+from foodgram.settings import REFERENCE_CACHE_TIMEOUT
+from api.serializers import RecipeIdsSerializer
+from recipes.cache import RANKINGS, RECIPE_LIST, get_version, get_versions
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscribe
 
 
 class CreateDeleteMixin:
-    def create_obj(self,
-                   serializer_class,
-                   serializer_return,
-                   model,
-                   request,
-                   pk):
-        if model == Recipe:
-            data = {'user': request.user.id, 'recipe': pk}
-        else:
-            data = {'user': request.user.id, 'author': pk}
-        serializer = serializer_class(data=data, context={'request': request})
-        serializer.is_valid(raise_exception=True)
-        serializer.save()
-        object = get_object_or_404(model, pk=pk)
+    """Добавление и удаление связей пользователя с рецептом или автором.
+
+    POST создаёт связь и отвечает 400, если она уже есть; PUT можно
+    повторять: он отвечает 201 при создании и 200, если связь была.
+    """
+    already_exists_messages = {
+        Favorite: 'Рецепт уже в избранном.',
+        ShoppingCart: 'Рецепт уже в списке покупок.',
+        Subscribe: 'Подписка уже оформлена.',
+    }
+
+    @staticmethod
+    def get_target_id(pk):
+        try:
+            return int(pk)
+        except (TypeError, ValueError):
+            raise Http404
+
+    @transaction.atomic
+    def create_obj(self, model, serializer_return, request, pk):
+        target, created = insert_relation(model, request.user.id,
+                                          self.get_target_id(pk))
+        if target is None:
+            raise Http404
+        if not created and request.method != 'PUT':
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY:
+                    [self.already_exists_messages[model]]
+            })
+        if created:
+            refresh_counter(model, target, serializer_return.Meta.fields)
         serializer_data = serializer_return(
-            object,
+            target,
             context={'request': request}
         ).data
         return Response(
             data=serializer_data,
-            status=status.HTTP_201_CREATED
+            status=status.HTTP_201_CREATED if created else status.HTTP_200_OK
         )
 
-    def delete_obj(self, model, **kwargs):
-        get_object_or_404(model, **kwargs).delete()
+    @transaction.atomic
+    def delete_obj(self, model, request, pk):
+        if not delete_relation(model, request.user.id,
+                               self.get_target_id(pk)):
+            raise Http404
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @transaction.atomic
+    def bulk_obj(self, model, request):
+        """Добавление или удаление связей с несколькими рецептами:
+        статус по каждому id."""
+        serializer = RecipeIdsSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        recipe_ids = list(dict.fromkeys(serializer.validated_data['recipes']))
+        found = set(Recipe.objects.filter(id__in=recipe_ids).values_list(
+            'id', flat=True
+        ))
+        if request.method == 'DELETE':
+            changed = delete_relations(model, request.user.id, found)
+            statuses = ('removed', 'absent')
+        else:
+            changed = insert_relations(model, request.user.id, found)
+            statuses = ('added', 'exists')
+        return Response({'results': [
+            {
+                'id': recipe_id,
+                'status': (
+                    'not_found' if recipe_id not in found
+                    else statuses[0] if recipe_id in changed
+                    else statuses[1]
+                ),
+            }
+            for recipe_id in recipe_ids
+        ]})
+
+
+class VersionedCacheMixin:
+    """Кеширует отрендеренный список под версией данных модели
+    и отвечает 304 на совпадающий If-None-Match."""
+    def list(self, request, *args, **kwargs):
+        if request.accepted_renderer.format != 'json':
+            return super().list(request, *args, **kwargs)
+        namespace = self.get_queryset().model._meta.label_lower
+        key = f'{namespace}:list:{get_version(namespace)}'
+        cached = cache.get(key)
+        if cached is None:
+            serializer = self.get_serializer(
+                self.filter_queryset(self.get_queryset()),
+                many=True
+            )
+            content = request.accepted_renderer.render(
+                serializer.data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            cached = (make_etag(content), content)
+            cache.set(key, cached, REFERENCE_CACHE_TIMEOUT)
+        etag, content = cached
+        if_none_match = request.META.get('HTTP_IF_NONE_MATCH', '')
+        etags = parse_etags(if_none_match)
+        if etag in etags or '*' in etags:
+            response = HttpResponseNotModified()
+        else:
+            response = HttpResponse(content,
+                                    content_type='application/json')
+        response['ETag'] = etag
+        patch_cache_control(response, no_cache=True)
+        patch_vary_headers(response, ('Accept',))
+        return response
+
+
+class AnonymousCacheMixin:
+    """Целиком кеширует ответы list и retrieve для анонимных
+    пользователей: у них ответ зависит только от адреса.
+
+    Ответ хранится вместе с версиями рецептов, авторов и тегов,
+    которые в нём есть, и перестаёт выдаваться, как только одна
+    из них изменится.
+    """
+    def list(self, request, *args, **kwargs):
+        namespaces = [RECIPE_LIST]
+        if request.query_params.get('ordering') in (
+            RecipeOrderingFilter.ranking_orderings
+        ):
+            namespaces.append(RANKINGS)
+        return self.cached_response(super().list, namespaces,
+                                    request, *args, **kwargs)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(super().retrieve, (),
+                                    request, *args, **kwargs)
+
+    def cached_response(self, handler, namespaces, request, *args, **kwargs):
+        if (request.user.is_authenticated
+                or request.accepted_renderer.format != 'json'):
+            return handler(request, *args, **kwargs)
+        key = response_key(request)
+        content = get_response(key)
+        if content is None:
+            # Версии списков читаются до запроса к базе, версии
+            # объектов — когда из ответа стало известно, какие они.
+            versions = get_versions(namespaces)
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+            data = response.data
+            versions.update(get_versions(
+                recipe_dependencies(data.get('results', (data,)))
+                - versions.keys()
+            ))
+            content = request.accepted_renderer.render(
+                data,
+                request.accepted_media_type,
+                self.get_renderer_context()
+            )
+            set_response(key, content, versions)
+        response = HttpResponse(content, content_type='application/json')
+        patch_vary_headers(response, ('Accept', 'Authorization'))
+        return response
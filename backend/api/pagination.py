@@ -0,0 +1,214 @@
+import heapq
+from itertools import islice
+from operator import attrgetter, eq, ge, gt, le, lt
+
+from rest_framework.filters import BaseFilterBackend
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+
+MAX_PAGE_SIZE = 100
+RANK_LOOKUPS = {'exact': eq, 'gt': gt, 'gte': ge, 'lt': lt, 'lte': le}
+
+
+class PageLimitPagination(PageNumberPagination):
+    """Постраничная пагинация с размером страницы в параметре limit."""
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class LimitCursorPagination(CursorPagination):
+    """Пагинация по курсору без COUNT(*) и OFFSET."""
+    page_size_query_param = 'limit'
+    max_page_size = MAX_PAGE_SIZE
+
+
+class RecipeCursorPagination(LimitCursorPagination):
+    ordering = ('name', 'id')
+
+
+class SubscriptionCursorPagination(LimitCursorPagination):
+    ordering = ('username', 'id')
+
+
+class FeedCursorPagination(LimitCursorPagination):
+    ordering = ('-feed_date', '-id')
+
+
+class MergedQuerySet:
+    """Несколько querysets с одной сортировкой как один для
+    пагинации по курсору: order_by и filter применяются к каждому,
+    срез объединяет уже отсортированные части. Все поля сортировки
+    должны идти в одном направлении."""
+
+    def __init__(self, querysets, ordering=None):
+        self.querysets = tuple(querysets)
+        self.ordering = ordering
+
+    def order_by(self, *ordering):
+        return MergedQuerySet(
+            (queryset.order_by(*ordering) for queryset in self.querysets),
+            ordering
+        )
+
+    def filter(self, *args, **kwargs):
+        return MergedQuerySet(
+            (queryset.filter(*args, **kwargs)
+             for queryset in self.querysets),
+            self.ordering
+        )
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice) or not self.ordering:
+            raise TypeError('Поддерживаются только срезы после order_by')
+        reverse = self.ordering[0].startswith('-')
+        key = attrgetter(*(field.lstrip('-') for field in self.ordering))
+        merged = heapq.merge(
+            *(queryset[:item.stop] for queryset in self.querysets),
+            key=key, reverse=reverse
+        )
+        return list(islice(merged, item.start, item.stop))
+
+
+class RankedQuerySet:
+    """Рецепты с рангом из словаря ranks как queryset для пагинации.
+
+    Сортировка по рангу и id и фильтры по рангу выполняются в Python,
+    из базы срез загружает только рецепты своей страницы. Для прочих
+    сортировок порядок id берётся из базы без передачи в неё ranks.
+    """
+    ordered = True
+
+    def __init__(self, queryset, ranks, field, ordering=None):
+        self.queryset = queryset
+        self.ranks = ranks
+        self.field = field
+        self.ordering = ordering or ('-' + field, 'id')
+
+    def _clone(self, queryset=None, ranks=None, ordering=None):
+        return RankedQuerySet(
+            self.queryset if queryset is None else queryset,
+            self.ranks if ranks is None else ranks,
+            self.field,
+            ordering or self.ordering
+        )
+
+    def order_by(self, *ordering):
+        return self._clone(ordering=ordering)
+
+    def filter(self, *args, **kwargs):
+        ranks = self.ranks
+        for key in [key for key in kwargs if key.startswith(self.field)]:
+            _, _, lookup = key.partition('__')
+            compare = RANK_LOOKUPS[lookup or 'exact']
+            value = float(kwargs.pop(key))
+            ranks = {recipe_id: rank for recipe_id, rank in ranks.items()
+                     if compare(rank, value)}
+        queryset = self.queryset
+        if args or kwargs:
+            queryset = queryset.filter(*args, **kwargs)
+        return self._clone(queryset, ranks)
+
+    def distinct(self, *fields):
+        return self._clone(self.queryset.distinct(*fields))
+
+    def with_ranking(self):
+        return self._clone(self.queryset.with_ranking())
+
+    def _ids(self):
+        if not hasattr(self, '_ordered_ids'):
+            self._ordered_ids = self._get_ids()
+        return self._ordered_ids
+
+    def _get_ids(self):
+        ranks = self.ranks
+        if {field.lstrip('-') for field in self.ordering} - {self.field,
+                                                             'id'}:
+            return [recipe_id for recipe_id in self.queryset.order_by(
+                *self.ordering
+            ).values_list('id', flat=True) if recipe_id in ranks]
+        ids = list(ranks)
+        if self.queryset.query.has_filters():
+            found = set(self.queryset.filter(id__in=ids).values_list(
+                'id', flat=True
+            )) if len(ids) <= MAX_PAGE_SIZE else set(
+                self.queryset.values_list('id', flat=True)
+            )
+            ids = [recipe_id for recipe_id in ids if recipe_id in found]
+        # Устойчивая сортировка: от последнего поля к первому.
+        for field in reversed(self.ordering):
+            key = ranks.get if field.lstrip('-') == self.field else None
+            ids.sort(key=key, reverse=field.startswith('-'))
+        return ids
+
+    def count(self):
+        return len(self._ids())
+
+    def __len__(self):
+        return self.count()
+
+    def __iter__(self):
+        return iter(self[:])
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            raise TypeError('Поддерживаются только срезы')
+        page_ids = self._ids()[item]
+        recipes = self.queryset.filter(id__in=page_ids).in_bulk()
+        page = [recipes[recipe_id] for recipe_id in page_ids
+                if recipe_id in recipes]
+        for recipe in page:
+            setattr(recipe, self.field, self.ranks[recipe.id])
+        return page
+
+
+class RecipeOrderingFilter(BaseFilterBackend):
+    """Сортировка рецептов по ключам, для которых есть индексы."""
+    ordering_param = 'ordering'
+    orderings = {
+        'newest': ('-pub_date', '-id'),
+        'name': ('name', 'id'),
+        'cooking_time': ('cooking_time', 'id'),
+        'popular': ('-popular_score', '-id'),
+        'trending': ('-trending_score', '-id'),
+    }
+    ranking_orderings = ('popular', 'trending')
+    default_ordering = 'name'
+    ranked_orderings = {
+        'search': ('-search_rank', 'id'),
+        'ingredients': ('-ingredient_coverage', 'id'),
+    }
+
+    def get_ordering(self, request, queryset, view):
+        """Явная сортировка, иначе по релевантности для поиска
+        и подбора по ингредиентам, иначе по умолчанию."""
+        params = request.query_params
+        key = params.get(self.ordering_param)
+        if key in self.orderings:
+            return self.orderings[key]
+        for param, ordering in self.ranked_orderings.items():
+            if params.get(param, '').strip():
+                return ordering
+        return self.orderings[self.default_ordering]
+
+    def filter_queryset(self, request, queryset, view):
+        if request.query_params.get(self.ordering_param) in (
+            self.ranking_orderings
+        ):
+            queryset = queryset.with_ranking()
+        return queryset.order_by(*self.get_ordering(request, queryset, view))
+
+
+class CursorPaginationMixin:
+    """Пагинация по курсору для ?pagination=cursor и ?cursor=,
+    иначе pagination_class представления."""
+    cursor_pagination_class = LimitCursorPagination
+
+    @property
+    def paginator(self):
+        if not hasattr(self, '_paginator'):
+            params = self.request.query_params
+            paginator = super().paginator
+            if (not isinstance(paginator, CursorPagination)
+                    and ('cursor' in params
+                         or params.get('pagination') == 'cursor')):
+                self._paginator = self.cursor_pagination_class()
+        return self._paginator
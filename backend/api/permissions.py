@@ -9,3 +9,24 @@ class IsAuthorOrAdminOrReadOnly(permissions.BasePermission):
             or obj.author == request.user
             or request.user.is_staff
         )
+
+
+class IsAdminOrReadOnly(permissions.BasePermission):
+    """Справочники (теги, ингредиенты) меняет только администратор."""
+
+    def has_permission(self, request, view):
+        return (
+            request.method in permissions.SAFE_METHODS
+            or request.user.is_staff
+        )
+
+
+class IsCurrentUserOrAdminOrReadOnly(permissions.BasePermission):
+    """Профиль меняет сам пользователь или администратор."""
+
+    def has_object_permission(self, request, view, obj):
+        return (
+            request.method in permissions.SAFE_METHODS
+            or obj == request.user
+            or request.user.is_staff
+        )
@@ -0,0 +1,214 @@
+from django.db import IntegrityError, connection, transaction
+
+from api.feed import backfill, prune
+from api.signals import COUNTERS, change_counters
+from recipes.models import Favorite, ShoppingCart
+from recipes.shopping_cart import add_recipes_to_totals
+from users.models import Subscribe, User
+
+TARGET_FIELDS = {
+    Favorite: 'recipe',
+    ShoppingCart: 'recipe',
+    Subscribe: 'author',
+}
+
+
+def _relation_meta(model):
+    target_field = model._meta.get_field(TARGET_FIELDS[model])
+    user_field = model._meta.get_field('user')
+    return target_field, user_field
+
+
+def _insert_columns(model):
+    """Столбцы и значения для INSERT, кроме пользователя и цели:
+    поля auto_now_add заполняются временем транзакции."""
+    fields = [field for field in model._meta.concrete_fields
+              if getattr(field, 'auto_now_add', False)]
+    quote = connection.ops.quote_name
+    return (''.join(f', {quote(field.column)}' for field in fields),
+            ', NOW()' * len(fields))
+
+
+def _instance(model, user_id, target_id):
+    target_field, _ = _relation_meta(model)
+    return model(user_id=user_id, **{target_field.attname: target_id})
+
+
+def insert_relation(model, user_id, target_id):
+    """Добавляет связь пользователя с рецептом или автором, если её ещё нет.
+
+    Возвращает (цель или None, создана ли связь). В PostgreSQL цель
+    читается тем же запросом, что и INSERT ... ON CONFLICT DO NOTHING.
+    """
+    target_field, user_field = _relation_meta(model)
+    target_model = target_field.related_model
+    if connection.vendor != 'postgresql':
+        target = target_model.objects.filter(pk=target_id).first()
+        if target is None:
+            return None, False
+        try:
+            with transaction.atomic():
+                model.objects.create(user_id=user_id,
+                                     **{target_field.attname: target_id})
+        except IntegrityError:
+            return target, False
+        return target, True
+    quote = connection.ops.quote_name
+    columns, values = _insert_columns(model)
+    sql = (
+        'WITH target AS ('
+        f'SELECT * FROM {quote(target_model._meta.db_table)} '
+        f'WHERE {quote(target_model._meta.pk.column)} = %s'
+        '), inserted AS ('
+        f'INSERT INTO {quote(model._meta.db_table)} '
+        f'({quote(user_field.column)}, {quote(target_field.column)}'
+        f'{columns}) '
+        f'SELECT %s, {quote(target_model._meta.pk.column)}{values} '
+        'FROM target '
+        'ON CONFLICT DO NOTHING '
+        f'RETURNING {quote(model._meta.pk.column)}'
+        ') '
+        'SELECT target.*, inserted.'
+        f'{quote(model._meta.pk.column)} AS relation_id '
+        'FROM target LEFT JOIN inserted ON TRUE'
+    )
+    targets = list(target_model.objects.raw(sql, (target_id, user_id)))
+    if not targets:
+        return None, False
+    target = targets[0]
+    if target.relation_id is None:
+        return target, False
+    relations_changed(model, user_id, (target_id,), 1)
+    return target, True
+
+
+def delete_relation(model, user_id, target_id):
+    """Удаляет связь одним DELETE ... RETURNING. Возвращает True,
+    если связь была."""
+    target_field, user_field = _relation_meta(model)
+    if connection.vendor != 'postgresql':
+        deleted, _ = model.objects.filter(
+            user_id=user_id, **{target_field.attname: target_id}
+        ).delete()
+        return bool(deleted)
+    quote = connection.ops.quote_name
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(user_field.column)} = %s '
+            f'AND {quote(target_field.column)} = %s '
+            f'RETURNING {quote(model._meta.pk.column)}',
+            (user_id, target_id)
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return False
+    relations_changed(model, user_id, (target_id,), -1)
+    return True
+
+
+def relations_changed(model, user_id, target_ids, delta):
+    """Лента, счётчики и итоги корзины для связей, добавленных
+    или удалённых в обход сигналов."""
+    if not target_ids:
+        return
+    if model is Subscribe:
+        for author_id in target_ids:
+            if delta > 0:
+                backfill(user_id, author_id)
+            else:
+                prune(user_id, author_id)
+    change_counters(model, target_ids, delta)
+    if model is ShoppingCart:
+        add_recipes_to_totals(user_id, target_ids, sign=delta)
+
+
+def refresh_counter(model, target, fields):
+    """Перечитывает счётчик связей цели, если он есть среди fields:
+    insert_relation возвращает цель, прочитанную до добавления."""
+    _, _, field = COUNTERS[model]
+    if field in fields:
+        target.refresh_from_db(fields=(field,))
+
+
+def _locked_relations(model, user_id, target_ids):
+    """Цели из target_ids, с которыми у пользователя есть связь.
+
+    Без INSERT ... RETURNING добавленные и удалённые строки не узнать,
+    поэтому строка пользователя блокируется до конца транзакции:
+    параллельные пакетные запросы того же пользователя ждут её.
+    """
+    target_field, _ = _relation_meta(model)
+    list(User.objects.select_for_update().filter(
+        pk=user_id
+    ).values_list('pk', flat=True))
+    return set(model.objects.filter(
+        user_id=user_id, **{f'{target_field.attname}__in': target_ids}
+    ).values_list(target_field.attname, flat=True))
+
+
+def insert_relations(model, user_id, target_ids):
+    """Добавляет связи с несколькими существующими целями сразу;
+    возвращает множество целей, для которых связь создана."""
+    target_field, user_field = _relation_meta(model)
+    target_model = target_field.related_model
+    if connection.vendor != 'postgresql':
+        with transaction.atomic():
+            inserted = set(target_ids) - _locked_relations(
+                model, user_id, target_ids
+            )
+            model.objects.bulk_create(
+                _instance(model, user_id, target_id)
+                for target_id in inserted
+            )
+        relations_changed(model, user_id, inserted, 1)
+        return inserted
+    quote = connection.ops.quote_name
+    columns, values = _insert_columns(model)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({quote(user_field.column)}, {quote(target_field.column)}'
+            f'{columns}) '
+            f'SELECT %s, {quote(target_model._meta.pk.column)}{values} '
+            f'FROM {quote(target_model._meta.db_table)} '
+            f'WHERE {quote(target_model._meta.pk.column)} = ANY(%s) '
+            'ON CONFLICT DO NOTHING '
+            f'RETURNING {quote(target_field.column)}',
+            (user_id, list(target_ids))
+        )
+        inserted = {row[0] for row in cursor.fetchall()}
+    relations_changed(model, user_id, inserted, 1)
+    return inserted
+
+
+def delete_relations(model, user_id, target_ids):
+    """Удаляет связи с несколькими целями сразу; возвращает
+    множество целей, для которых связь была."""
+    target_field, user_field = _relation_meta(model)
+    quote = connection.ops.quote_name
+    if connection.vendor != 'postgresql':
+        with transaction.atomic():
+            deleted = _locked_relations(model, user_id, target_ids)
+            if deleted:
+                with connection.cursor() as cursor:
+                    cursor.execute(
+                        f'DELETE FROM {quote(model._meta.db_table)} '
+                        f'WHERE {quote(user_field.column)} = %s '
+                        f'AND {quote(target_field.column)} IN '
+                        f'({", ".join(["%s"] * len(deleted))})',
+                        (user_id, *deleted)
+                    )
+        relations_changed(model, user_id, deleted, -1)
+        return deleted
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(user_field.column)} = %s '
+            f'AND {quote(target_field.column)} = ANY(%s) '
+            f'RETURNING {quote(target_field.column)}',
+            (user_id, list(target_ids))
+        )
+        deleted = {row[0] for row in cursor.fetchall()}
+    relations_changed(model, user_id, deleted, -1)
+    return deleted
@@ -0,0 +1,52 @@
+import hashlib
+from urllib.parse import urlencode
+
+from django.core.cache import cache
+
+from foodgram.settings import RESPONSE_CACHE_TIMEOUT
+from recipes.cache import RECIPES, get_versions, object_namespace
+from recipes.models import Recipe, Tag
+from users.models import User
+
+
+def make_etag(content):
+    return '"{}"'.format(hashlib.sha1(content).hexdigest())
+
+
+def recipe_dependencies(recipes):
+    """Версии, от которых зависят сериализованные рецепты:
+    сами рецепты, их авторы и теги."""
+    namespaces = set()
+    for recipe in recipes:
+        namespaces.add(object_namespace(Recipe, recipe['id']))
+        namespaces.add(object_namespace(User, recipe['author']['id']))
+        namespaces.update(object_namespace(Tag, tag['id'])
+                          for tag in recipe['tags'])
+    return namespaces
+
+
+def response_key(request):
+    """Ключ ответа: адрес и параметры запроса без пустых значений,
+    отсортированные по имени и значению."""
+    params = sorted(
+        (name, value)
+        for name, values in request.query_params.lists()
+        for value in values if value.strip()
+    )
+    url = request.build_absolute_uri(request.path) + '?' + urlencode(params)
+    return f'{RECIPES}:response:' + hashlib.sha1(url.encode()).hexdigest()
+
+
+def get_response(key):
+    """Сохранённый ответ, если ни одна из его версий не изменилась."""
+    entry = cache.get(key)
+    if entry is None:
+        return None
+    versions, content = entry
+    if get_versions(versions) != versions:
+        return None
+    return content
+
+
+def set_response(key, content, versions):
+    cache.set(key, (versions, content), RESPONSE_CACHE_TIMEOUT)
@@ -1,12 +1,18 @@
+from django.core.files.storage import default_storage
 from django.db import transaction
-from djoser.serializers import UserSerializer
+from djoser.serializers import (CurrentPasswordSerializer,
+                                UidAndTokenSerializer, UserSerializer)
 from rest_framework import serializers
 from drf_extra_fields.fields import Base64ImageField
 
-from recipes.models import (Tag, Recipe, RecipeIngredient,
-                            Ingredient, Favorite, ShoppingCart)
-from users.models import User, Subscribe
-from foodgram.settings import DEFAULT_LIMIT
+from recipes.images import IMAGE_PENDING
+from recipes.models import Tag, Recipe, RecipeIngredient, Ingredient
+from users.models import User
+from recipes.cache import invalidate_recipes
+from recipes.recipe_index import notify_recipes_changed
+from recipes.shopping_cart import update_recipe_in_totals
+from foodgram.settings import (DEFAULT_LIMIT, MAX_BULK_RECIPES,
+                               MAX_RECIPES_LIMIT)
 
 
 class CustomUserCreateSerializer(serializers.ModelSerializer):
@@ -35,86 +41,123 @@ class UserReadSerializer(UserSerializer):
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name',
-                  'last_name', 'password', 'is_subscribed')
+                  'last_name', 'password', 'is_subscribed',
+                  'recipes_count', 'subscribers_count')
+        read_only_fields = ('recipes_count', 'subscribers_count')
 
     def get_is_subscribed(self, obj):
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         request = self.context.get('request')
-        return (
+        return bool(
             request and request.user.is_authenticated
-            and obj.subscribing.filter(author=obj).exists()
+            and obj.subscribing.filter(user=request.user).exists()
         )
 
 
+class NewUsernameSerializer(serializers.ModelSerializer):
+    """Новый username. Djoser читает new_<USERNAME_FIELD>, а его
+    сериализаторы при LOGIN_FIELD email отдают new_email."""
+
+    class Meta:
+        model = User
+        fields = ('username',)
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['new_username'] = self.fields.pop('username')
+
+
+class SetUsernameSerializer(NewUsernameSerializer, CurrentPasswordSerializer):
+    """[POST] Смена username текущего пользователя."""
+
+    class Meta:
+        model = User
+        fields = ('username', 'current_password')
+
+
+class UsernameResetConfirmSerializer(UidAndTokenSerializer,
+                                     NewUsernameSerializer):
+    """[POST] Смена username по ссылке из письма."""
+
+
+class RecipesLimitSerializer(serializers.Serializer):
+    """Параметр recipes_limit для списка подписок."""
+    recipes_limit = serializers.IntegerField(
+        min_value=0,
+        max_value=MAX_RECIPES_LIMIT,
+        default=DEFAULT_LIMIT,
+    )
+
+
+def get_recipes_limit(request):
+    serializer = RecipesLimitSerializer(data=request.query_params)
+    serializer.is_valid(raise_exception=True)
+    return serializer.validated_data['recipes_limit']
+
+
 class SubscriptionSerializer(UserReadSerializer):
     """[GET] Список авторов на которых подписан пользователь."""
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
-    is_subscribed = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name',
-                  'last_name', 'recipes', 'recipes_count', 'is_subscribed')
-
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
+                  'last_name', 'recipes', 'recipes_count',
+                  'subscribers_count', 'is_subscribed')
+        read_only_fields = ('recipes_count', 'subscribers_count')
 
     def get_recipes(self, obj):
         request = self.context.get('request')
-        limit = request.GET.get('recipes_limit', DEFAULT_LIMIT)
-        recipes = obj.recipes.all()
-        recipes = recipes[:int(limit)]
+        if hasattr(obj, 'recipes_preview'):
+            recipes = obj.recipes_preview
+        else:
+            recipes = obj.recipes.all()[:get_recipes_limit(request)]
         serializer = RecipeSerializer(recipes,
                                       many=True,
                                       context={'request': request})
         return serializer.data
 
-    def get_is_subscribed(self, obj):
-        request = self.context.get('request')
-        return (
-            request and request.user.is_authenticated
-            and obj.subscribing.filter(author=obj).exists()
-        )
-
 
-class SubscribeAuthorSerializer(serializers.ModelSerializer):
-    """[POST] Подписка на авторов."""
-    class Meta:
-        model = Subscribe
-        fields = (
-            'user',
-            'author',
-        )
+class ImageVariantsField(serializers.Field):
+    """Ссылки на уменьшенные копии изображения рецепта,
+    None пока копии не готовы."""
+    def __init__(self, **kwargs):
+        kwargs['source'] = '*'
+        kwargs['read_only'] = True
+        super().__init__(**kwargs)
 
-    def validate(self, obj):
-        user = self.context['request'].user
-        author = obj['author']
-        if user == author:
-            raise serializers.ValidationError('Нельзя подписаться на себя')
-        if Subscribe.objects.filter(user=user, author=author).exists():
-            raise serializers.ValidationError('Подписка уже оформлена')
-        return obj
+    def to_representation(self, recipe):
+        if not recipe.image_processed or not recipe.image_variants:
+            return None
+        request = self.context.get('request')
+        return {
+            size: {
+                extension: request.build_absolute_uri(
+                    default_storage.url(name)
+                )
+                for extension, name in formats.items()
+            }
+            for size, formats in recipe.image_variants.items()
+        }
 
 
 class RecipeSerializer(serializers.ModelSerializer):
     """[GET] Список рецептов без ингредиентов."""
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+    image_variants = ImageVariantsField()
 
-
-class FavoriteSerializer(serializers.ModelSerializer):
-    """[GET] Список избранного."""
     class Meta:
-        model = Favorite
-        fields = ('id', 'user', 'recipe')
+        model = Recipe
+        fields = ('id', 'name', 'image', 'image_variants', 'cooking_time')
 
 
-class ShoppingCartSerializer(serializers.ModelSerializer):
-    """[GET] Список содержимого корзины покупок."""
-    class Meta:
-        model = ShoppingCart
-        fields = ('id', 'user', 'recipe')
+class RecipeIdsSerializer(serializers.Serializer):
+    """[POST, DELETE] Список id рецептов для пакетных операций."""
+    recipes = serializers.ListField(
+        child=serializers.IntegerField(),
+        allow_empty=False,
+        max_length=MAX_BULK_RECIPES,
+    )
 
 
 class IngredientSerializer(serializers.ModelSerializer):
@@ -143,11 +186,27 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
 
+class RecipeIngredientWriteSerializer(serializers.Serializer):
+    """[POST, PATCH] Ингредиент и его количество в рецепте."""
+    id = serializers.IntegerField()
+    amount = serializers.IntegerField(
+        validators=RecipeIngredient._meta.get_field('amount').validators
+    )
+
+
 class RecipeCreateSerializer(serializers.ModelSerializer):
     """[GET, POST, PATCH, DELETE]Чтение, создание,
     изменение, удаление рецепта."""
     author = UserReadSerializer(read_only=True)
+    tags = serializers.ListField(
+        child=serializers.IntegerField(),
+        write_only=True
+    )
+    ingredients = RecipeIngredientSerializer(
+        source='recipes', many=True, read_only=True
+    )
     image = Base64ImageField()
+    image_variants = ImageVariantsField()
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
 
@@ -155,36 +214,75 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients',
                   'is_favorited', 'is_in_shopping_cart',
-                  'name', 'image', 'text', 'cooking_time')
+                  'name', 'image', 'image_variants', 'text',
+                  'cooking_time', 'favorites_count', 'shopping_carts_count')
+        read_only_fields = ('favorites_count', 'shopping_carts_count')
 
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         user = self.context.get('request').user
-        return obj.favorite_recipe.filter(user=user).exists()
+        return (user.is_authenticated
+                and obj.favorite_recipe.filter(user=user).exists())
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         user = self.context.get('request').user
-        return obj.shoppingcart_recipe.filter(user=user).exists()
+        return (user.is_authenticated
+                and obj.shoppingcart_recipe.filter(user=user).exists())
 
-    def validate_tags(self, data):
-        tags = self.initial_data.get('tags')
+    def validate_tags(self, tags):
         if not tags:
             raise serializers.ValidationError('Нужно указать минимум 1 тег.')
-        return data
-
-    def validate_ingredients(self, data):
-        ingredients = self.initial_data.get('ingredients')
+        found = set(Tag.objects.filter(id__in=tags).values_list(
+            'id', flat=True
+        ))
+        errors, seen = {}, set()
+        for index, tag in enumerate(tags):
+            if tag not in found:
+                errors[index] = ['Тег не найден.']
+            elif tag in seen:
+                errors[index] = ['Теги должны быть уникальны.']
+            seen.add(tag)
+        if errors:
+            raise serializers.ValidationError(errors)
+        return tags
+
+    def validate_ingredients(self, ingredients):
         if not ingredients:
             raise serializers.ValidationError(
                 'Нужно указать минимум 1 ингредиент.'
             )
-        ingredient_ids = [ingredient['id'] for ingredient in ingredients]
-        if len(ingredient_ids) != len(set(ingredient_ids)):
+        if not isinstance(ingredients, list):
             raise serializers.ValidationError(
-                'Ингредиенты должны быть уникальны.'
+                'Ингредиенты нужно передать списком.'
             )
-        return data
+        validated, errors = [], []
+        for ingredient in ingredients:
+            serializer = RecipeIngredientWriteSerializer(data=ingredient)
+            valid = serializer.is_valid()
+            validated.append(serializer.validated_data if valid else None)
+            errors.append({} if valid else serializer.errors)
+        found = set(Ingredient.objects.filter(id__in=[
+            ingredient['id'] for ingredient in validated if ingredient
+        ]).values_list('id', flat=True))
+        seen = set()
+        for index, ingredient in enumerate(validated):
+            if ingredient is None:
+                continue
+            if ingredient['id'] not in found:
+                errors[index] = {'id': ['Ингредиент не найден.']}
+            elif ingredient['id'] in seen:
+                errors[index] = {'id': ['Ингредиенты должны быть уникальны.']}
+            seen.add(ingredient['id'])
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return validated
 
     def create_and_update_recipe(self, recipe, ingredients):
+        if not ingredients:
+            return
         recipe_ingredients = []
         for ingredient in ingredients:
             recipe_ingredient = RecipeIngredient(
@@ -205,28 +303,93 @@ class RecipeCreateSerializer(serializers.ModelSerializer):
         )
         recipe.tags.set(tags)
         self.create_and_update_recipe(recipe, ingredients)
+        Recipe.objects.filter(pk=recipe.pk).update_search_vector()
+        notify_recipes_changed((recipe.pk,))
         return recipe
 
+    def update_tags(self, recipe, tags):
+        current = set(recipe.tags.values_list('id', flat=True))
+        new = {int(tag) for tag in tags}
+        if current - new:
+            recipe.tags.remove(*(current - new))
+        if new - current:
+            recipe.tags.add(*(new - current))
+
+    def update_ingredients(self, recipe, ingredients):
+        """Меняет только добавленные, изменённые и удалённые
+        ингредиенты рецепта."""
+        existing = {
+            recipe_ingredient.ingredient_id: recipe_ingredient
+            for recipe_ingredient in RecipeIngredient.objects.filter(
+                recipe=recipe
+            )
+        }
+        old_amounts = {ingredient_id: recipe_ingredient.amount
+                       for ingredient_id, recipe_ingredient
+                       in existing.items()}
+        new_amounts = {
+            int(ingredient['id']): int(ingredient['amount'])
+            for ingredient in ingredients
+        }
+        to_update = []
+        for ingredient_id, amount in new_amounts.items():
+            recipe_ingredient = existing.get(ingredient_id)
+            if recipe_ingredient and recipe_ingredient.amount != amount:
+                recipe_ingredient.amount = amount
+                to_update.append(recipe_ingredient)
+        to_delete = [recipe_ingredient.id
+                     for ingredient_id, recipe_ingredient in existing.items()
+                     if ingredient_id not in new_amounts]
+        self.create_and_update_recipe(recipe, [
+            ingredient for ingredient in ingredients
+            if int(ingredient['id']) not in existing
+        ])
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ('amount',))
+        if to_delete:
+            RecipeIngredient.objects.filter(id__in=to_delete).delete()
+        update_recipe_in_totals(recipe, old_amounts, new_amounts)
+
     @transaction.atomic
     def update(self, instance, validated_data):
-        tags = validated_data.pop('tags', [])
-        ingredients = validated_data.pop('ingredients', [])
-        instance.tags.set(tags)
-        instance.ingredients.clear()
-        self.create_and_update_recipe(instance, ingredients)
-        return super().update(instance, validated_data)
+        tags = validated_data.pop('tags', None)
+        ingredients = validated_data.pop('ingredients', None)
+        if 'image' in validated_data:
+            validated_data.update(IMAGE_PENDING)
+        if tags is not None:
+            self.update_tags(instance, tags)
+        if ingredients is not None:
+            self.update_ingredients(instance, ingredients)
+            notify_recipes_changed((instance.pk,))
+            invalidate_recipes((instance.pk,))
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        if validated_data:
+            instance.save(update_fields=validated_data.keys())
+        if ingredients is not None or {'name', 'text'} & validated_data.keys():
+            Recipe.objects.filter(pk=instance.pk).update_search_vector()
+        return instance
 
     def to_representation(self, instance):
+        if hasattr(instance, 'author_is_subscribed'):
+            instance.author.is_subscribed = instance.author_is_subscribed
         data = super().to_representation(instance)
-        data['ingredients'] = RecipeIngredientSerializer(
-            instance.recipes.all(), many=True).data
-        data['tags'] = TagSerializer(instance.tags, many=True).data
+        data['tags'] = TagSerializer(instance.tags.all(), many=True).data
         return data
 
     def to_internal_value(self, data):
-        internal_value = super().to_internal_value(data)
-        ingredients = data.get('ingredients')
-        internal_value['ingredients'] = ingredients
-        tags = data.get('tags')
-        internal_value['tags'] = tags
+        errors = {}
+        try:
+            internal_value = super().to_internal_value(data)
+        except serializers.ValidationError as error:
+            errors, internal_value = error.detail, {}
+        if 'ingredients' in data or not self.partial:
+            try:
+                internal_value['ingredients'] = self.validate_ingredients(
+                    data.get('ingredients')
+                )
+            except serializers.ValidationError as error:
+                errors['ingredients'] = error.detail
+        if errors:
+            raise serializers.ValidationError(errors)
         return internal_value
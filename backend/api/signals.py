@@ -0,0 +1,164 @@
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import (m2m_changed, post_delete, post_save,
+                                      pre_delete)
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from api.authentication import token_cache
+from api.feed import backfill, fan_out, prune
+from recipes.cache import (RECIPE_LIST, bump_version, invalidate,
+                           invalidate_objects, invalidate_recipes,
+                           object_namespace)
+from recipes.recipe_index import notify_recipes_changed
+from recipes.shopping_cart import (add_recipe_to_totals,
+                                   remove_recipe_from_totals)
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeRanking, ShoppingCart, Tag)
+from users.models import Subscribe, User
+
+
+@receiver((post_save, post_delete), sender=Ingredient)
+@receiver((post_save, post_delete), sender=Tag)
+def bump_reference_version(sender, **kwargs):
+    bump_version(sender._meta.label_lower)
+
+
+@receiver((post_save, post_delete), sender=Tag)
+def forget_tag_responses(sender, instance, **kwargs):
+    invalidate((object_namespace(sender, instance.pk), RECIPE_LIST))
+
+
+@receiver(post_save, sender=User)
+def forget_author_responses(sender, instance, **kwargs):
+    invalidate_objects(sender, (instance.pk,))
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def forget_recipe_responses(instance, raw=False, **kwargs):
+    if not raw:
+        invalidate_recipes((instance.pk,))
+
+
+@receiver(m2m_changed, sender=Recipe.tags.through)
+def forget_recipe_tags_responses(instance, action, reverse, pk_set,
+                                 **kwargs):
+    if not reverse:
+        recipe_ids = (instance.pk,)
+    elif action == 'pre_clear':
+        recipe_ids = instance.recipes_tag.values_list('id', flat=True)
+    else:
+        recipe_ids = pk_set
+    if action in ('post_add', 'post_remove', 'pre_clear'):
+        invalidate_recipes(recipe_ids)
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(pre_delete, sender=Ingredient)
+def forget_ingredient_responses(instance, created=False, **kwargs):
+    if not created:
+        invalidate_recipes(RecipeIngredient.objects.filter(
+            ingredient=instance
+        ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_delete, sender=Token)
+def forget_token(instance, **kwargs):
+    token_cache.delete(instance.key)
+
+
+@receiver(post_save, sender=User)
+def forget_user_tokens(instance, update_fields=None, **kwargs):
+    if update_fields is not None and set(update_fields) <= {'last_login'}:
+        return
+    token_cache.delete(*Token.objects.filter(
+        user_id=instance.pk
+    ).values_list('key', flat=True))
+
+
+@receiver(post_save, sender=Ingredient)
+def refresh_recipes_search(instance, created, **kwargs):
+    if not created:
+        Recipe.objects.filter(
+            recipes__ingredient=instance
+        ).update_search_vector()
+
+
+@receiver(pre_delete, sender=Ingredient)
+def forget_ingredient_recipes(instance, **kwargs):
+    notify_recipes_changed(RecipeIngredient.objects.filter(
+        ingredient=instance
+    ).values_list('recipe_id', flat=True))
+
+
+@receiver(post_save, sender=Recipe)
+def add_recipe_to_rankings_and_feeds(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        RecipeRanking.objects.create(recipe=instance)
+        fan_out(instance)
+
+
+@receiver(post_save, sender=Subscribe)
+def backfill_feed(instance, created, raw=False, **kwargs):
+    if created and not raw:
+        backfill(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Subscribe)
+def prune_feed(instance, **kwargs):
+    prune(instance.user_id, instance.author_id)
+
+
+@receiver(post_delete, sender=Recipe)
+def forget_recipe(instance, **kwargs):
+    notify_recipes_changed((instance.pk,))
+
+
+@receiver(post_save, sender=ShoppingCart)
+def add_to_cart_totals(instance, created, **kwargs):
+    if created:
+        add_recipe_to_totals(instance.user_id, instance.recipe_id)
+
+
+@receiver(pre_delete, sender=ShoppingCart)
+def remove_from_cart_totals(instance, **kwargs):
+    remove_recipe_from_totals(instance.user_id, instance.recipe_id)
+
+
+COUNTERS = {
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'shopping_carts_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Subscribe: (User, 'author_id', 'subscribers_count'),
+}
+
+
+def change_counters(sender, target_ids, delta):
+    model, _, field = COUNTERS[sender]
+    model.objects.filter(pk__in=target_ids).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
+    invalidate_objects(model, target_ids)
+
+
+def change_counter(instance, delta):
+    _, attribute, _ = COUNTERS[type(instance)]
+    change_counters(type(instance), (getattr(instance, attribute),), delta)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscribe)
+def increment_counter(instance, created, **kwargs):
+    if created:
+        change_counter(instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscribe)
+def decrement_counter(instance, **kwargs):
+    change_counter(instance, -1)
@@ -0,0 +1,120 @@
+import base64
+import io
+
+from django.core.cache import cache
+from PIL import Image
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.ingredient_index import ingredient_index
+from recipes.recipe_index import recipe_index
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeNeighbour, ShoppingCart, Tag)
+from users.models import Subscribe, User
+
+PASSWORD = 'budget-password'
+RECIPES_PER_AUTHOR = 2
+INGREDIENTS_PER_RECIPE = 3
+TAGS = 3
+
+
+def reset_caches():
+    """Очищает кеш Django и индексы процесса, чтобы версии и ответы
+    прошлых тестов не меняли число запросов."""
+    cache.clear()
+    ingredient_index.reset()
+    recipe_index.reset()
+
+
+def image_base64():
+    buffer = io.BytesIO()
+    Image.new('RGB', (8, 8), (200, 120, 60)).save(buffer, 'PNG')
+    return ('data:image/png;base64,'
+            + base64.b64encode(buffer.getvalue()).decode())
+
+
+def make_user(name, **fields):
+    return User.objects.create_user(
+        username=name, email=f'{name}@budget.test', password=PASSWORD,
+        first_name=name, last_name=name, **fields
+    )
+
+
+class Dataset:
+    """Пользователи, рецепты и связи, число которых растёт с size.
+
+    reader подписан на всех авторов, а все рецепты у него в избранном
+    и в корзине; у первого рецепта похожими отмечены все остальные.
+    author — автор первого рецепта без подписок и избранного.
+    """
+
+    def __init__(self, size):
+        self.size = size
+        self.reader = make_user('reader')
+        self.staff = make_user('staff', is_staff=True)
+        self.authors = [make_user(f'author{number}')
+                        for number in range(size)]
+        self.author = self.authors[0]
+        self.tags = [
+            Tag.objects.create(name=f'tag{number}', color=f'#00000{number}',
+                               slug=f'tag{number}')
+            for number in range(TAGS)
+        ]
+        self.ingredients = [
+            Ingredient.objects.create(name=f'ingredient{number}',
+                                      measurement_unit='г')
+            for number in range(size + INGREDIENTS_PER_RECIPE)
+        ]
+        self.recipes = [self.make_recipe(number)
+                        for number in range(RECIPES_PER_AUTHOR * size)]
+        self.recipe = self.recipes[0]
+        for author in self.authors:
+            Subscribe.objects.create(user=self.reader, author=author)
+        for recipe in self.recipes:
+            Favorite.objects.create(user=self.reader, recipe=recipe)
+            ShoppingCart.objects.create(user=self.reader, recipe=recipe)
+        RecipeNeighbour.objects.bulk_create(
+            RecipeNeighbour(recipe=self.recipe, neighbour=recipe,
+                            score=1 / number)
+            for number, recipe in enumerate(self.recipes[1:], 1)
+        )
+        Recipe.objects.update_search_vector()
+
+    def make_recipe(self, number):
+        recipe = Recipe.objects.create(
+            name=f'recipe{number}', text='text', cooking_time=10,
+            author=self.authors[number % self.size],
+            image='recipes/budget.png',
+        )
+        recipe.tags.set(self.tags[:2])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient=self.ingredients[(number + offset)
+                                            % len(self.ingredients)],
+                amount=offset + 1,
+            )
+            for offset in range(INGREDIENTS_PER_RECIPE)
+        )
+        return recipe
+
+    def client(self, name):
+        """Клиент с токеном пользователя name или анонимный."""
+        client = APIClient()
+        if name != 'anonymous':
+            token, _ = Token.objects.get_or_create(user=getattr(self, name))
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+        return client
+
+    def recipe_payload(self):
+        return {
+            'name': 'new recipe',
+            'text': 'text',
+            'cooking_time': 15,
+            'image': image_base64(),
+            'tags': [tag.id for tag in self.tags[:2]],
+            'ingredients': [
+                {'id': ingredient.id, 'amount': 10}
+                for ingredient in self.ingredients[:INGREDIENTS_PER_RECIPE]
+            ],
+        }
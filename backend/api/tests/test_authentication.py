@@ -0,0 +1,71 @@
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from api.authentication import CACHED_FIELDS, token_cache
+from users.models import User
+
+
+class CachedTokenAuthenticationTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user(
+            username='reader', email='reader@test.io', password='secret',
+            first_name='Reader',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token.key}')
+
+    def tearDown(self):
+        token_cache.delete(self.token.key)
+
+    def test_cache_holds_only_id_and_flags(self):
+        self.client.get('/api/users/me/')
+        values = cache.get(token_cache.cache_key(self.token.key))
+        self.assertEqual(
+            dict(zip(CACHED_FIELDS, values)),
+            {'id': self.user.id, 'is_active': True, 'is_staff': False},
+        )
+
+    def test_cached_user_loads_other_fields_in_one_query(self):
+        self.client.get('/api/users/me/')
+        user = token_cache.get(self.token.key)
+        with self.assertNumQueries(1):
+            self.assertEqual((user.email, user.first_name),
+                             ('reader@test.io', 'Reader'))
+        self.assertIn('recipes_count', user.get_deferred_fields())
+
+    def test_inactive_cached_user_is_rejected(self):
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        token_cache.set(self.token.key, User.objects.get(pk=self.user.pk))
+        response = self.client.get('/api/users/me/')
+        self.assertEqual(response.status_code, 401)
+
+
+class SetUsernameTests(TestCase):
+
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='reader', email='reader@test.io', password='secret',
+        )
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_set_username(self):
+        response = self.client.post('/api/users/set_username/', {
+            'current_password': 'secret', 'new_username': 'renamed',
+        })
+        self.assertEqual(response.status_code, 204)
+        self.user.refresh_from_db()
+        self.assertEqual(self.user.username, 'renamed')
+
+    def test_taken_username_is_rejected(self):
+        User.objects.create(username='taken', email='taken@test.io')
+        response = self.client.post('/api/users/set_username/', {
+            'current_password': 'secret', 'new_username': 'taken',
+        })
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('new_username', response.data)
@@ -0,0 +1,77 @@
+import base64
+import shutil
+import tempfile
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.test import TestCase, override_settings
+
+from recipes import images
+from recipes.images import MAX_ATTEMPTS, process_pending_images
+from recipes.models import Recipe
+from users.models import User
+
+from api.tests.dataset import image_base64
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class ProcessImagesTests(TestCase):
+    """Очередь обработки изображений: повтор после ошибки
+    и сброс при смене изображения."""
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        author = User.objects.create(username='author',
+                                     email='author@test.io')
+        content = base64.b64decode(image_base64().partition(',')[2])
+        self.recipe = Recipe.objects.create(
+            name='recipe', text='text', cooking_time=10, author=author,
+            image=default_storage.save('recipes/test.png',
+                                       ContentFile(content)),
+        )
+
+    def test_processes_image(self):
+        self.assertEqual(process_pending_images(10), 1)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image_processed)
+        self.assertEqual(set(self.recipe.image_variants),
+                         set(images.VARIANT_SIZES))
+        self.assertIsNone(self.recipe.image_claimed_at)
+        self.assertEqual(process_pending_images(10), 0)
+
+    def test_failure_is_retried(self):
+        with mock.patch.object(images, 'build_variants',
+                               side_effect=OSError):
+            with self.assertLogs(images.logger, 'ERROR'):
+                self.assertEqual(process_pending_images(10), 1)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image_processed)
+        self.assertEqual(self.recipe.image_attempts, 1)
+        # Взятый рецепт ждёт CLAIM_TIMEOUT, затем снова в очереди.
+        self.assertEqual(process_pending_images(10), 0)
+        Recipe.objects.update(image_claimed_at=None)
+        self.assertEqual(process_pending_images(10), 1)
+        self.recipe.refresh_from_db()
+        self.assertTrue(self.recipe.image_processed)
+        self.assertEqual(self.recipe.image_attempts, 0)
+
+    def test_gives_up_after_max_attempts(self):
+        Recipe.objects.update(image_attempts=MAX_ATTEMPTS)
+        self.assertEqual(process_pending_images(10), 0)
+
+    def test_admin_image_change_requeues(self):
+        process_pending_images(10)
+        self.recipe.refresh_from_db()
+        self.recipe.image = 'recipes/other.png'
+        form = mock.Mock(changed_data=['image'])
+        site._registry[Recipe].save_model(None, self.recipe, form, True)
+        self.recipe.refresh_from_db()
+        self.assertFalse(self.recipe.image_processed)
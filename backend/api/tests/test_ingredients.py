@@ -0,0 +1,29 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from api.ingredient_index import ingredient_index
+from recipes.models import Ingredient
+
+
+class IngredientSearchTests(TestCase):
+    """Поиск ингредиентов по началу названия."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for name in ('соль', 'сахар', 'мука'):
+            Ingredient.objects.create(name=name, measurement_unit='г')
+
+    def setUp(self):
+        ingredient_index.reset()
+        self.client = APIClient()
+
+    def names(self, name):
+        response = self.client.get('/api/ingredients/', {'name': name})
+        self.assertEqual(response.status_code, 200)
+        return [ingredient['name'] for ingredient in response.json()]
+
+    def test_prefix(self):
+        self.assertEqual(self.names(' С'), ['сахар', 'соль'])
+
+    def test_blank_name_returns_nothing(self):
+        self.assertEqual(self.names('   '), [])
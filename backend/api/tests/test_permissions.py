@@ -0,0 +1,58 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import Ingredient, Tag
+from users.models import User
+
+
+class PermissionTests(TestCase):
+    """Изменение справочников и профилей без прав: отказ, а не 500."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader',
+                                       email='reader@test.io')
+        cls.other = User.objects.create(username='other',
+                                        email='other@test.io')
+        cls.staff = User.objects.create(username='staff',
+                                        email='staff@test.io',
+                                        is_staff=True)
+        cls.ingredient = Ingredient.objects.create(name='соль',
+                                                   measurement_unit='г')
+        cls.tag = Tag.objects.create(name='tag', color='#ABCDEF',
+                                     slug='tag')
+
+    def client_for(self, user):
+        client = APIClient()
+        client.force_authenticate(user)
+        return client
+
+    def test_only_staff_changes_ingredients_and_tags(self):
+        urls = (f'/api/ingredients/{self.ingredient.id}/',
+                f'/api/tags/{self.tag.id}/')
+        for url in urls:
+            with self.subTest(url=url):
+                client = self.client_for(self.user)
+                self.assertEqual(client.patch(url, {'name': 'new'})
+                                 .status_code, 403)
+                self.assertEqual(client.delete(url).status_code, 403)
+                self.assertEqual(APIClient().patch(url, {'name': 'new'})
+                                 .status_code, 401)
+                self.assertEqual(self.client_for(self.staff)
+                                 .patch(url, {'name': 'new'})
+                                 .status_code, 200)
+        response = self.client_for(self.user).post(
+            '/api/ingredients/', {'name': 'new', 'measurement_unit': 'кг'}
+        )
+        self.assertEqual(response.status_code, 403)
+
+    def test_user_profile_is_changed_by_owner_or_staff(self):
+        url = f'/api/users/{self.other.id}/'
+        # При HIDE_USERS djoser отвечает на отказ 404.
+        self.assertEqual(self.client_for(self.user)
+                         .patch(url, {'first_name': 'new'}).status_code, 404)
+        self.assertEqual(self.client_for(self.other)
+                         .patch(url, {'first_name': 'new'}).status_code, 200)
+        self.assertEqual(self.client_for(self.staff)
+                         .patch(url, {'first_name': 'new'}).status_code, 200)
+        self.assertEqual(APIClient().get(url).status_code, 200)
@@ -0,0 +1,41 @@
+import shutil
+import tempfile
+from pathlib import Path
+from unittest import mock
+
+from django.test import TestCase
+from rest_framework.authtoken.models import Token
+
+from foodgram.settings import PROFILING
+from users.models import User
+
+
+class ProfilingTests(TestCase):
+    """Профилирование запросов сотрудников по заголовку X-Profile."""
+
+    def setUp(self):
+        self.root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.root, ignore_errors=True)
+        patcher = mock.patch.dict(PROFILING, ROOT=self.root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        staff = User.objects.create(username='staff', email='staff@test.io',
+                                    is_staff=True)
+        token = Token.objects.create(user=staff)
+        self.headers = {'HTTP_AUTHORIZATION': f'Token {token.key}',
+                        'HTTP_X_PROFILE': '1'}
+
+    def test_regular_response(self):
+        response = self.client.get('/api/tags/', **self.headers)
+        self.assertTrue(
+            (Path(self.root) / response['X-Profile-Name']).exists()
+        )
+
+    def test_streaming_response_saved_after_body(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/',
+                                   **self.headers)
+        self.assertTrue(response.streaming)
+        path = Path(self.root) / response['X-Profile-Name']
+        self.assertFalse(path.exists())
+        b''.join(response.streaming_content)
+        self.assertTrue(path.exists())
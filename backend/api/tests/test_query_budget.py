@@ -0,0 +1,403 @@
+"""Бюджеты запросов к базе и времени ответа для всех маршрутов API.
+
+Каждый случай выполняется на наборах данных нескольких размеров
+(SIZES), страницы списков растут вместе с данными. Число запросов
+не должно зависеть от размера и превышать бюджет случая. Время
+ответа проверяется, только если задана QUERY_BUDGET_CHECK_TIME:
+бюджет умножается на QUERY_BUDGET_TIME_SCALE. Если задана
+переменная окружения QUERY_BUDGET_REPORT, результаты записываются
+в этот файл в JSON для сравнения между коммитами.
+"""
+import json
+import os
+import shutil
+import tempfile
+import time
+from typing import Callable, NamedTuple, Optional
+
+from django.conf import settings
+from django.contrib.auth.tokens import default_token_generator
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import URLPattern, URLResolver, reverse
+from djoser.utils import encode_uid
+
+from api import urls as api_urls
+from api.tests.dataset import PASSWORD, Dataset, reset_caches
+
+SIZES = (3, 12)
+TIME_BUDGET_MS = 300
+TIME_SCALE = float(os.getenv('QUERY_BUDGET_TIME_SCALE', '1'))
+CHECK_TIME = bool(os.getenv('QUERY_BUDGET_CHECK_TIME'))
+REPORT = os.getenv('QUERY_BUDGET_REPORT')
+MEDIA_ROOT = tempfile.mkdtemp(prefix='query-budget-')
+
+
+class Case(NamedTuple):
+    route: str
+    method: str
+    url: Callable
+    queries: int
+    client: str = 'anonymous'
+    payload: Optional[Callable] = None
+    status: int = 200
+    variant: str = ''
+    # Повторный запрос: измеряется ответ из кеша.
+    warm: bool = False
+    time_ms: int = TIME_BUDGET_MS
+
+    @property
+    def key(self):
+        return '_'.join(filter(None, (
+            self.route.replace('-', '_'), self.method.lower(), self.variant
+        )))
+
+
+def url(route, query='', **kwargs):
+    """URL маршрута; значения kwargs и query — функции от набора данных
+    или шаблон с полями набора данных."""
+    def build(data):
+        path = reverse(route, kwargs={
+            name: value(data) for name, value in kwargs.items()
+        })
+        return path + ('?' + query.format(data=data) if query else '')
+    return build
+
+
+def recipe(data):
+    return data.recipe.id
+
+
+def other_recipe(data):
+    return data.recipes[1].id
+
+
+def author(data):
+    return data.author.id
+
+
+def other_author(data):
+    return data.authors[1].id
+
+
+def user_payload(data):
+    return {'email': 'new@budget.test', 'username': 'new',
+            'first_name': 'new', 'last_name': 'new', 'password': PASSWORD}
+
+
+def uid_token(data):
+    return {'uid': encode_uid(data.reader.pk),
+            'token': default_token_generator.make_token(data.reader)}
+
+
+def recipe_ids(data):
+    return {'recipes': [recipe.id for recipe in data.recipes]}
+
+
+def other_recipe_ids(data):
+    return {'recipes': [recipe.id for recipe in data.recipes
+                        if recipe.author_id != data.author.id]}
+
+
+def tag_payload(data):
+    return {'name': 'new', 'color': '#ABCDEF', 'slug': 'new'}
+
+
+def ingredient_payload(data):
+    return {'name': 'new', 'measurement_unit': 'кг'}
+
+
+PAGE = 'limit={data.size}'
+RECIPES_PAGE = 'limit=' + str(2 * max(SIZES))
+
+CASES = (
+    Case('api-root', 'GET', url('api-root'), 0),
+
+    Case('user-list', 'GET', url('user-list', PAGE), 1),
+    Case('user-list', 'GET', url('user-list', PAGE), 4,
+         client='reader', variant='reader'),
+    Case('user-list', 'POST', url('user-list'), 6,
+         payload=user_payload, status=201),
+    Case('user-detail', 'GET', url('user-detail', id=other_author), 3,
+         client='reader'),
+    Case('user-detail', 'PUT', url('user-detail', id=author), 7,
+         client='staff', payload=user_payload),
+    Case('user-detail', 'PATCH', url('user-detail', id=author), 5,
+         client='staff', payload=lambda data: {'first_name': 'new'}),
+    Case('user-detail', 'DELETE', url('user-detail', id=author), 45,
+         client='author', status=204,
+         payload=lambda data: {'current_password': PASSWORD}),
+    Case('user-me', 'GET', url('user-me'), 1, client='reader'),
+    Case('user-me', 'PUT', url('user-me'), 3,
+         client='author', payload=user_payload),
+    Case('user-me', 'PATCH', url('user-me'), 3,
+         client='author', payload=lambda data: {'first_name': 'new'}),
+    Case('user-me', 'DELETE', url('user-me'), 44,
+         client='author', status=204,
+         payload=lambda data: {'current_password': PASSWORD}),
+    Case('user-subscriptions', 'GET',
+         url('user-subscriptions', PAGE + '&recipes_limit=2'), 4,
+         client='reader'),
+    Case('user-subscribe', 'POST', url('user-subscribe', id=other_author),
+         10, client='author', status=201),
+    Case('user-subscribe', 'PUT', url('user-subscribe', id=other_author),
+         10, client='author', status=201),
+    Case('user-subscribe', 'DELETE',
+         url('user-subscribe', id=other_author), 6,
+         client='reader', status=204),
+    Case('user-activation', 'POST', url('user-activation'), 1,
+         payload=uid_token, status=403),
+    Case('user-resend-activation', 'POST', url('user-resend-activation'),
+         1, payload=lambda data: {'email': data.reader.email}, status=400),
+    Case('user-reset-password', 'POST', url('user-reset-password'), 1,
+         payload=lambda data: {'email': data.reader.email}, status=204),
+    Case('user-reset-password-confirm', 'POST',
+         url('user-reset-password-confirm'), 3, status=204,
+         payload=lambda data: {**uid_token(data),
+                               'new_password': 'x' + PASSWORD}),
+    Case('user-reset-username', 'POST', url('user-reset-username'), 1,
+         payload=lambda data: {'email': data.reader.email}, status=204),
+    Case('user-reset-username-confirm', 'POST',
+         url('user-reset-username-confirm'), 4, status=204,
+         payload=lambda data: {**uid_token(data),
+                               'new_username': 'renamed'}),
+    Case('user-set-password', 'POST', url('user-set-password'), 3,
+         client='reader', status=204,
+         payload=lambda data: {'current_password': PASSWORD,
+                               'new_password': 'x' + PASSWORD}),
+    Case('user-set-username', 'POST', url('user-set-username'), 4,
+         client='reader', status=204,
+         payload=lambda data: {'current_password': PASSWORD,
+                               'new_username': 'renamed'}),
+    Case('login', 'POST', url('login'), 6,
+         payload=lambda data: {'email': data.reader.email,
+                               'password': PASSWORD}),
+    Case('logout', 'POST', url('logout'), 3, client='reader', status=204),
+
+    Case('tag-list', 'GET', url('tag-list'), 1),
+    Case('tag-list', 'POST', url('tag-list'), 4,
+         client='staff', payload=tag_payload, status=201),
+    Case('tag-detail', 'GET',
+         url('tag-detail', pk=lambda data: data.tags[0].id), 1),
+    Case('tag-detail', 'PUT',
+         url('tag-detail', pk=lambda data: data.tags[0].id), 5,
+         client='staff', payload=tag_payload),
+    Case('tag-detail', 'PATCH',
+         url('tag-detail', pk=lambda data: data.tags[0].id), 3,
+         client='staff', payload=lambda data: {'name': 'new'}),
+    Case('tag-detail', 'DELETE',
+         url('tag-detail', pk=lambda data: data.tags[0].id), 4,
+         client='staff', status=204),
+
+    Case('ingredient-list', 'GET', url('ingredient-list'), 1),
+    Case('ingredient-list', 'GET', url('ingredient-list', 'name=ingr'), 1,
+         variant='name'),
+    Case('ingredient-list', 'POST', url('ingredient-list'), 2,
+         client='staff', payload=ingredient_payload, status=201),
+    Case('ingredient-detail', 'GET',
+         url('ingredient-detail', pk=lambda data: data.ingredients[0].id),
+         1),
+    Case('ingredient-detail', 'PUT',
+         url('ingredient-detail', pk=lambda data: data.ingredients[0].id),
+         5, client='staff', payload=ingredient_payload),
+    Case('ingredient-detail', 'PATCH',
+         url('ingredient-detail', pk=lambda data: data.ingredients[0].id),
+         5, client='staff', payload=lambda data: {'name': 'new'}),
+    Case('ingredient-detail', 'DELETE',
+         url('ingredient-detail', pk=lambda data: data.ingredients[0].id),
+         7, client='staff', status=204),
+
+    Case('recipe-list', 'GET', url('recipe-list', RECIPES_PAGE), 4),
+    Case('recipe-list', 'GET', url('recipe-list', RECIPES_PAGE), 0,
+         variant='cached', warm=True),
+    Case('recipe-list', 'GET', url('recipe-list', RECIPES_PAGE), 5,
+         client='reader', variant='reader'),
+    Case('recipe-list', 'GET',
+         url('recipe-list', RECIPES_PAGE + '&is_favorited=1'
+             '&is_in_shopping_cart=1&tags=tag0&tags=tag1'), 6,
+         client='reader', variant='filtered'),
+    Case('recipe-list', 'GET',
+         url('recipe-list', RECIPES_PAGE + '&search=recipe'), 2,
+         client='reader', variant='search'),
+    Case('recipe-list', 'GET',
+         url('recipe-list', RECIPES_PAGE + '&ingredients='
+             '{data.ingredients[0].id},{data.ingredients[1].id}'), 6,
+         client='reader', variant='ingredients'),
+    Case('recipe-list', 'GET',
+         url('recipe-list', RECIPES_PAGE + '&pagination=cursor'
+             '&ordering=popular'), 4,
+         client='reader', variant='cursor'),
+    Case('recipe-list', 'POST', url('recipe-list'), 23,
+         client='author', status=201,
+         payload=lambda data: data.recipe_payload()),
+    Case('recipe-detail', 'GET', url('recipe-detail', pk=recipe), 3),
+    Case('recipe-detail', 'GET', url('recipe-detail', pk=recipe), 4,
+         client='reader', variant='reader'),
+    Case('recipe-detail', 'PUT', url('recipe-detail', pk=recipe), 25,
+         client='author', payload=lambda data: data.recipe_payload()),
+    Case('recipe-detail', 'PATCH', url('recipe-detail', pk=recipe), 15,
+         client='author', payload=lambda data: {'name': 'new'}),
+    Case('recipe-detail', 'DELETE', url('recipe-detail', pk=recipe), 21,
+         client='author', status=204),
+    Case('recipe-favorite', 'POST', url('recipe-favorite', pk=other_recipe),
+         5, client='author', status=201),
+    Case('recipe-favorite', 'PUT', url('recipe-favorite', pk=other_recipe),
+         5, client='author', status=201),
+    Case('recipe-favorite', 'DELETE', url('recipe-favorite', pk=recipe), 5,
+         client='reader', status=204),
+    Case('recipe-shopping-cart', 'POST',
+         url('recipe-shopping-cart', pk=other_recipe), 10,
+         client='author', status=201),
+    Case('recipe-shopping-cart', 'PUT',
+         url('recipe-shopping-cart', pk=other_recipe), 10,
+         client='author', status=201),
+    Case('recipe-shopping-cart', 'DELETE',
+         url('recipe-shopping-cart', pk=recipe), 10,
+         client='reader', status=204),
+    Case('recipe-bulk-favorite', 'POST', url('recipe-bulk-favorite'), 6,
+         client='author', payload=other_recipe_ids),
+    Case('recipe-bulk-favorite', 'DELETE', url('recipe-bulk-favorite'), 6,
+         client='reader', payload=recipe_ids),
+    Case('recipe-bulk-shopping-cart', 'POST',
+         url('recipe-bulk-shopping-cart'), 11,
+         client='author', payload=other_recipe_ids),
+    Case('recipe-bulk-shopping-cart', 'DELETE',
+         url('recipe-bulk-shopping-cart'), 11,
+         client='reader', payload=recipe_ids),
+    Case('recipe-download-shopping-cart', 'GET',
+         url('recipe-download-shopping-cart'), 2, client='reader'),
+    Case('recipe-feed', 'GET', url('recipe-feed', PAGE), 5,
+         client='reader'),
+    Case('recipe-similar', 'GET', url('recipe-similar', pk=recipe), 1),
+)
+
+
+def api_routes(patterns=api_urls.urlpatterns):
+    """Пары (имя маршрута, HTTP-метод) всех маршрутов API."""
+    for pattern in patterns:
+        if isinstance(pattern, URLResolver):
+            yield from api_routes(pattern.url_patterns)
+            continue
+        if not isinstance(pattern, URLPattern) or not pattern.name:
+            continue
+        actions = getattr(pattern.callback, 'actions', None)
+        if actions is None:
+            view = pattern.callback.view_class
+            actions = [method for method in view.http_method_names
+                       if hasattr(view, method)]
+        for method in actions:
+            if method not in ('head', 'options'):
+                yield pattern.name, method.upper()
+
+
+@override_settings(
+    MEDIA_ROOT=MEDIA_ROOT,
+    PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher'],
+    DJOSER={
+        **settings.DJOSER,
+        'PASSWORD_RESET_CONFIRM_URL': 'reset/{uid}/{token}',
+        'USERNAME_RESET_CONFIRM_URL': 'reset-username/{uid}/{token}',
+    },
+)
+class QueryBudgetTests(TestCase):
+    """Тесты создаются по одному на случай из CASES.
+
+    Бюджеты запросов заданы для PostgreSQL, как в CI и в продакшене;
+    на других базах проверяется только, что число запросов
+    не растёт с размером данных.
+    """
+
+    results = []
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+        if REPORT:
+            with open(REPORT, 'w', encoding='utf-8') as file:
+                json.dump({
+                    'commit': os.getenv('GITHUB_SHA', ''),
+                    'database': connection.vendor,
+                    'sizes': SIZES,
+                    'time_scale': TIME_SCALE,
+                    'check_time': CHECK_TIME,
+                    'results': cls.results,
+                }, file, ensure_ascii=False, indent=2)
+
+    def measure(self, case, size):
+        """Выполняет случай на наборе данных size и откатывает
+        изменения. Возвращает ответ, число запросов и время в мс."""
+        savepoint = transaction.savepoint()
+        try:
+            data = Dataset(size)
+            client = data.client(case.client)
+            path = case.url(data)
+            payload = case.payload(data) if case.payload else None
+            request = getattr(client, case.method.lower())
+            reset_caches()
+            if case.warm:
+                request(path, payload, format='json')
+            with CaptureQueriesContext(connection) as queries:
+                start = time.perf_counter()
+                with self.captureOnCommitCallbacks(execute=True):
+                    response = request(path, payload, format='json')
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                elapsed = (time.perf_counter() - start) * 1000
+            return response, len(queries), elapsed
+        finally:
+            transaction.savepoint_rollback(savepoint)
+
+    def check(self, case):
+        counts = {}
+        for size in SIZES:
+            response, counts[size], elapsed = self.measure(case, size)
+            self.results.append({
+                'case': case.key, 'route': case.route,
+                'method': case.method, 'variant': case.variant,
+                'size': size, 'status': response.status_code,
+                'queries': counts[size], 'time_ms': round(elapsed, 2),
+                'query_budget': case.queries, 'time_budget_ms':
+                    case.time_ms * TIME_SCALE,
+            })
+            with self.subTest(size=size):
+                self.assertEqual(
+                    response.status_code, case.status,
+                    getattr(response, 'data', None)
+                )
+                if CHECK_TIME:
+                    self.assertLessEqual(
+                        elapsed, case.time_ms * TIME_SCALE,
+                        f'Ответ дольше бюджета при size={size}'
+                    )
+        self.assertEqual(
+            len(set(counts.values())), 1,
+            f'Число запросов растёт с размером данных: {counts}'
+        )
+        if connection.vendor == 'postgresql':
+            self.assertLessEqual(max(counts.values()), case.queries,
+                                 'Запросов к базе больше бюджета')
+
+
+def make_test(case):
+    def test(self):
+        self.check(case)
+    test.__doc__ = f'{case.method} {case.route} {case.variant}'.strip()
+    return test
+
+
+for _case in CASES:
+    setattr(QueryBudgetTests, f'test_{_case.key}', make_test(_case))
+
+
+class RouteCoverageTests(TestCase):
+
+    def test_every_route_has_case(self):
+        covered = {(case.route, case.method) for case in CASES}
+        missing = sorted(set(api_routes()) - covered)
+        self.assertEqual(missing, [], 'Маршруты API без бюджета запросов')
+
+    def test_case_keys_are_unique(self):
+        keys = [case.key for case in CASES]
+        self.assertEqual(len(keys), len(set(keys)))
@@ -0,0 +1,29 @@
+from django.test import TestCase
+
+from recipes.models import Favorite, RankingWatermark, Recipe, RecipeRanking
+from recipes.ranking import refresh_rankings
+from users.models import User
+
+
+class RefreshRankingsTests(TestCase):
+    """Пересчёт популярности от отметки времени в базе."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader',
+                                       email='reader@test.io')
+        cls.recipe = Recipe.objects.create(
+            name='recipe', text='text', cooking_time=10, author=cls.user,
+            image='recipes/test.png',
+        )
+
+    def test_incremental_refresh(self):
+        refresh_rankings()
+        first = RankingWatermark.objects.get()
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        self.assertEqual(refresh_rankings(), 1)
+        self.assertGreater(RankingWatermark.objects.get().until, first.until)
+        ranking = RecipeRanking.objects.get(recipe=self.recipe)
+        self.assertEqual(ranking.popular_score, 1)
+        self.assertGreater(ranking.trending_score, 0)
+        self.assertEqual(refresh_rankings(), 0)
@@ -0,0 +1,202 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, Tag)
+from recipes.recipe_index import recipe_index
+from users.models import Subscribe, User
+
+# Запросов к базе на страницу списка и на карточку рецепта; токен
+# авторизованного пользователя добавляет ещё один.
+LIST_QUERIES = 4
+DETAIL_QUERIES = 3
+IMAGE = ('data:image/png;base64,iVBORw0KGgoAAAANSUhEUgAAAAEAAAABCAYAAAAf'
+         'FcSJAAAADUlEQVR42mP8z8BQDwAEhQGAhKmMIQAAAABJRU5ErkJggg==')
+
+
+class RecipeQueryCountTests(TestCase):
+    """Число запросов к базе не зависит от числа рецептов на странице."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader',
+                                       email='reader@test.io')
+        cls.authors = [
+            User.objects.create(username=f'author{number}',
+                                email=f'author{number}@test.io')
+            for number in range(3)
+        ]
+        cls.tags = [
+            Tag.objects.create(name=f'tag{number}', color=f'#00000{number}',
+                               slug=f'tag{number}')
+            for number in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ingredient{number}',
+                                      measurement_unit='г')
+            for number in range(3)
+        ]
+        cls.recipe = cls.add_recipes(1)[0]
+        for author in cls.authors:
+            Subscribe.objects.create(user=cls.user, author=author)
+
+    @classmethod
+    def add_recipes(cls, count):
+        recipes = []
+        for number in range(count):
+            recipe = Recipe.objects.create(
+                name=f'recipe{Recipe.objects.count()}', text='text',
+                cooking_time=10, author=cls.authors[number % 3],
+                image='recipes/test.png',
+            )
+            recipe.tags.set(cls.tags)
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=10)
+                for ingredient in cls.ingredients
+            )
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+            recipes.append(recipe)
+        return recipes
+
+    def setUp(self):
+        cache.clear()
+        self.reader = APIClient()
+        token, _ = Token.objects.get_or_create(user=self.user)
+        self.reader.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+
+    def count_queries(self, client, url):
+        """Число запросов повторного запроса при пустом кеше Django."""
+        client.get(url)
+        cache.clear()
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return len(queries)
+
+    def test_list(self):
+        for client, budget in ((APIClient(), LIST_QUERIES),
+                               (self.reader, LIST_QUERIES + 1)):
+            small = self.count_queries(client, '/api/recipes/')
+            self.add_recipes(8)
+            large = self.count_queries(client, '/api/recipes/')
+            self.assertEqual(small, large)
+            self.assertLessEqual(large, budget)
+
+    def test_detail(self):
+        url = f'/api/recipes/{self.recipe.id}/'
+        self.assertLessEqual(self.count_queries(APIClient(), url),
+                             DETAIL_QUERIES)
+        self.assertLessEqual(self.count_queries(self.reader, url),
+                             DETAIL_QUERIES + 1)
+
+
+class RecipeIngredientsFilterTests(TestCase):
+    """Подбор по ингредиентам: порядок по доле найденных ингредиентов
+    и загрузка из базы только рецептов страницы."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.authors = [
+            User.objects.create(username=f'author{number}',
+                                email=f'author{number}@test.io')
+            for number in range(2)
+        ]
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ingredient{number}',
+                                      measurement_unit='г')
+            for number in range(4)
+        ]
+        cls.recipes = []
+        # Рецепт number содержит первые number + 1 ингредиентов.
+        for number in range(4):
+            recipe = Recipe.objects.create(
+                name=f'recipe{number}', text='text', cooking_time=10,
+                author=cls.authors[number % 2], image='recipes/test.png',
+            )
+            RecipeIngredient.objects.bulk_create(
+                RecipeIngredient(recipe=recipe, ingredient=ingredient,
+                                 amount=10)
+                for ingredient in cls.ingredients[:number + 1]
+            )
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        cache.clear()
+        recipe_index.reset()
+        first, second = self.ingredients[:2]
+        self.url = f'/api/recipes/?ingredients={first.id},{second.id}'
+
+    def ids(self, response):
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_recipe_ids_above_32_bits(self):
+        ingredient = self.ingredients[0]
+        recipe_index.coverage([ingredient.id])
+        recipe = Recipe.objects.create(
+            id=2 ** 32 + 1, name='recipe', text='text', cooking_time=10,
+            author=self.authors[0], image='recipes/test.png',
+        )
+        RecipeIngredient.objects.create(recipe=recipe, ingredient=ingredient,
+                                        amount=10)
+        recipe_index.recipes_changed([recipe.id])
+        self.assertEqual(recipe_index.coverage([ingredient.id])[recipe.id],
+                         (1, 1))
+        recipe_index.reset()
+        self.assertEqual(recipe_index.coverage([ingredient.id])[recipe.id],
+                         (1, 1))
+
+    def test_ranked_pages(self):
+        recipes = self.recipes
+        expected = [recipes[0].id, recipes[1].id, recipes[2].id,
+                    recipes[3].id]
+        client = APIClient()
+        response = client.get(self.url + '&limit=2')
+        self.assertEqual(response.json()['count'], 4)
+        self.assertEqual(self.ids(response), expected[:2])
+        with CaptureQueriesContext(connection) as queries:
+            response = client.get(self.url + '&limit=2&page=2')
+        self.assertEqual(self.ids(response), expected[2:])
+        page_ids = f'"id" IN ({recipes[2].id}, {recipes[3].id})'
+        self.assertTrue(any(page_ids in query['sql'] for query in queries))
+
+    def test_ranked_cursor(self):
+        client = APIClient()
+        response = client.get(self.url + '&pagination=cursor&limit=3')
+        ids = self.ids(response)
+        ids += self.ids(client.get(response.json()['next']))
+        self.assertEqual(ids, [recipe.id for recipe in self.recipes])
+
+    def test_ranked_with_filter(self):
+        response = APIClient().get(
+            self.url + f'&author={self.authors[1].id}'
+        )
+        self.assertEqual(self.ids(response),
+                         [self.recipes[1].id, self.recipes[3].id])
+
+    def test_explicit_ordering(self):
+        response = APIClient().get(self.url + '&ordering=newest')
+        self.assertEqual(self.ids(response),
+                         [recipe.id for recipe in reversed(self.recipes)])
+
+
+class RecipeWriteTests(TestCase):
+
+    def test_create_requires_ingredients(self):
+        user = User.objects.create(username='author', email='author@test.io')
+        tag = Tag.objects.create(name='tag', color='#000000', slug='tag')
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.post('/api/recipes/', {
+            'name': 'recipe', 'text': 'text', 'cooking_time': 10,
+            'tags': [tag.id], 'ingredients': [], 'image': IMAGE,
+        }, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('ingredients', response.data)
+        self.assertFalse(Recipe.objects.exists())
@@ -0,0 +1,95 @@
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart)
+from users.models import Subscribe, User
+
+
+class RelationTests(TestCase):
+    """Избранное, корзина и подписки: счётчики после добавления
+    и удаления связей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader',
+                                       email='reader@test.io')
+        cls.author = User.objects.create(username='author',
+                                         email='author@test.io')
+        ingredient = Ingredient.objects.create(name='ingredient',
+                                               measurement_unit='г')
+        cls.recipes = []
+        for number in range(3):
+            recipe = Recipe.objects.create(
+                name=f'recipe{number}', text='text', cooking_time=10,
+                author=cls.author, image='recipes/test.png',
+            )
+            RecipeIngredient.objects.create(recipe=recipe,
+                                            ingredient=ingredient,
+                                            amount=10)
+            cls.recipes.append(recipe)
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_subscribe_returns_new_counter(self):
+        url = f'/api/users/{self.author.id}/subscribe/'
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.data['subscribers_count'], 1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.subscribers_count, 0)
+        self.assertFalse(Subscribe.objects.exists())
+
+    def test_favorite_counter(self):
+        url = f'/api/recipes/{self.recipes[0].id}/favorite/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].favorites_count, 1)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.client.delete(url).status_code, 404)
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].favorites_count, 0)
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_shopping_cart_counter(self):
+        url = f'/api/recipes/{self.recipes[0].id}/shopping_cart/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].shopping_carts_count, 1)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.recipes[0].refresh_from_db()
+        self.assertEqual(self.recipes[0].shopping_carts_count, 0)
+        self.assertFalse(ShoppingCart.objects.exists())
+
+    def test_bulk_shopping_cart(self):
+        url = '/api/recipes/bulk_shopping_cart/'
+        first, second, third = (recipe.id for recipe in self.recipes)
+        self.client.post(f'/api/recipes/{first}/shopping_cart/')
+        response = self.client.post(url, {'recipes': [first, second, 0]},
+                                    format='json')
+        self.assertEqual(response.data['results'], [
+            {'id': first, 'status': 'exists'},
+            {'id': second, 'status': 'added'},
+            {'id': 0, 'status': 'not_found'},
+        ])
+        response = self.client.delete(url, {'recipes': [second, third]},
+                                      format='json')
+        self.assertEqual(response.data['results'], [
+            {'id': second, 'status': 'removed'},
+            {'id': third, 'status': 'absent'},
+        ])
+        counts = dict(Recipe.objects.values_list('id',
+                                                 'shopping_carts_count'))
+        self.assertEqual(counts, {first: 1, second: 0, third: 0})
+        self.assertEqual(list(ShoppingCart.objects.values_list(
+            'recipe_id', flat=True
+        )), [first])
+
+    def test_subscriptions_without_follows(self):
+        response = self.client.get('/api/users/subscriptions/')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data['results'], [])
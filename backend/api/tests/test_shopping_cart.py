@@ -0,0 +1,84 @@
+from io import StringIO
+from unittest import mock
+
+from django.contrib.admin.sites import site
+from django.core.management import call_command
+from django.test import TestCase
+
+from recipes import shopping_cart
+from recipes.models import (Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart, ShoppingCartIngredient)
+from recipes.shopping_cart import apply_cart_deltas
+from users.models import User
+
+
+class CartTotalsTests(TestCase):
+    """Итоги корзины ShoppingCartIngredient."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create(username='reader',
+                                       email='reader@test.io')
+        cls.ingredients = [
+            Ingredient.objects.create(name=f'ingredient{number}',
+                                      measurement_unit='г')
+            for number in range(2)
+        ]
+        cls.recipe = Recipe.objects.create(
+            name='recipe', text='text', cooking_time=10, author=cls.user,
+            image='recipes/test.png',
+        )
+        RecipeIngredient.objects.create(recipe=cls.recipe,
+                                        ingredient=cls.ingredients[0],
+                                        amount=10)
+
+    def totals(self):
+        return dict(ShoppingCartIngredient.objects.values_list(
+            'ingredient_id', 'amount'
+        ))
+
+    def test_concurrent_insert_is_added_to(self):
+        ingredient = self.ingredients[0]
+        ShoppingCartIngredient.objects.create(
+            user=self.user, ingredient=ingredient, amount=5
+        )
+        locked_rows = shopping_cart._locked_cart_rows
+        calls = []
+
+        def missed_first(keys):
+            # Первое чтение не видит строку, вставленную параллельно.
+            calls.append(keys)
+            return {} if len(calls) == 1 else locked_rows(keys)
+
+        with mock.patch.object(shopping_cart, '_locked_cart_rows',
+                               side_effect=missed_first):
+            apply_cart_deltas({(self.user.id, ingredient.id): 3})
+        self.assertEqual(self.totals(), {ingredient.id: 8})
+
+    def test_admin_ingredient_change_updates_totals(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        self.assertEqual(self.totals(), {self.ingredients[0].id: 10})
+        admin = site._registry[Recipe]
+        form = mock.Mock(instance=self.recipe)
+
+        def save_formsets(request, form, formsets, change):
+            RecipeIngredient.objects.filter(recipe=self.recipe).update(
+                amount=4
+            )
+            RecipeIngredient.objects.create(
+                recipe=self.recipe, ingredient=self.ingredients[1], amount=2
+            )
+
+        with mock.patch('django.contrib.admin.ModelAdmin.save_related',
+                        side_effect=save_formsets):
+            admin.save_related(None, form, [], True)
+        self.assertEqual(self.totals(), {self.ingredients[0].id: 4,
+                                         self.ingredients[1].id: 2})
+
+    def test_rebuild_skips_zero_totals(self):
+        RecipeIngredient.objects.create(recipe=self.recipe,
+                                        ingredient=self.ingredients[1],
+                                        amount=0)
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        self.assertEqual(self.totals(), {self.ingredients[0].id: 10})
+        call_command('rebuildcarts', '--check', stdout=StringIO())
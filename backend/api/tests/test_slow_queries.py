@@ -0,0 +1,41 @@
+import json
+import unittest
+from unittest import mock
+
+from django.db import connection
+from django.test import TestCase
+
+from foodgram import slow_queries
+from foodgram.settings import SLOW_QUERIES
+from foodgram.slow_queries import explain, log_slow_query
+
+SQL = ('SELECT "authtoken_token"."key" FROM "authtoken_token" '
+       'WHERE "authtoken_token"."key" = %s AND "authtoken_token"'
+       '."user_id" = %s')
+
+
+class SlowQueryLogTests(TestCase):
+    """Журнал медленных запросов не хранит значения параметров."""
+
+    def logged(self, **settings):
+        with mock.patch.dict(SLOW_QUERIES, EXPLAIN_RATE=1, **settings):
+            with self.assertLogs(slow_queries.logger) as logs:
+                log_slow_query('login', SQL, ['secret-token', 7], False, 1)
+        self.assertNotIn('secret-token', logs.output[0])
+        return json.loads(logs.records[0].getMessage())
+
+    def test_params_are_not_logged_by_default(self):
+        entry = self.logged()
+        self.assertEqual(entry['query'], SQL)
+        self.assertNotIn('params', entry)
+
+    def test_logged_params_are_redacted(self):
+        entry = self.logged(LOG_PARAMS=True)
+        self.assertEqual(entry['params'], ['?', 7])
+
+    @unittest.skipUnless(connection.vendor == 'postgresql',
+                         'EXPLAIN только в PostgreSQL')
+    def test_generic_plan_without_params(self):
+        plan = explain(connection, SQL + " AND 'a%%' LIKE 'a%%'")
+        self.assertIn('authtoken_token', plan)
+        self.assertNotIn('EXPLAIN не выполнен', plan)
@@ -1,35 +1,60 @@
-from django.db.models import F, Sum
-from django.shortcuts import HttpResponse
+from django.db.models import Prefetch, Value, prefetch_related_objects
+from django.http import Http404, HttpResponse, StreamingHttpResponse
 from djoser.views import UserViewSet
 from rest_framework.viewsets import ModelViewSet
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.permissions import IsAuthenticated
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
 
-from api.mixins import CreateDeleteMixin
+from api.ingredient_index import ingredient_index
+from api.mixins import (AnonymousCacheMixin, CreateDeleteMixin,
+                        VersionedCacheMixin)
+from api.feed import feed_querysets
+from api.pagination import (CursorPaginationMixin, FeedCursorPagination,
+                            MergedQuerySet, RecipeCursorPagination,
+                            RecipeOrderingFilter,
+                            SubscriptionCursorPagination)
+from api.renderers import SHOPPING_CART_RENDERERS
+from recipes.shopping_cart import export_shopping_cart
 from recipes.models import (
-    Tag, Recipe, Ingredient, Favorite,
-    ShoppingCart, RecipeIngredient)
+    Tag, Recipe, Ingredient, Favorite, ShoppingCart)
 from api.serializers import (
     TagSerializer, SubscriptionSerializer,
-    RecipeCreateSerializer, ShoppingCartSerializer,
-    IngredientSerializer, SubscribeAuthorSerializer,
-    FavoriteSerializer, RecipeSerializer)
+    RecipeCreateSerializer, IngredientSerializer,
+    RecipeSerializer, get_recipes_limit)
 from api.filters import SearchIngredientFilter, RecipeFilter
 from users.models import User, Subscribe
-from api.permissions import IsAuthorOrAdminOrReadOnly
+from api.permissions import (IsAdminOrReadOnly, IsAuthorOrAdminOrReadOnly,
+                             IsCurrentUserOrAdminOrReadOnly)
 
 
-class CastomUserViewSet(CreateDeleteMixin, UserViewSet):
+class CastomUserViewSet(CreateDeleteMixin, CursorPaginationMixin,
+                        UserViewSet):
     queryset = User.objects.all()
-    permission_classes = (IsAuthorOrAdminOrReadOnly, AllowAny)
+    permission_classes = (IsCurrentUserOrAdminOrReadOnly,)
+    cursor_pagination_class = SubscriptionCursorPagination
 
     @action(detail=False,
             methods=['get'],
             permission_classes=[IsAuthenticated])
     def subscriptions(self, request):
-        queryset = User.objects.filter(subscribing__user=request.user)
+        recipes_limit = get_recipes_limit(request)
+        queryset = (User.objects
+                    .filter(subscribing__user=request.user)
+                    .annotate(is_subscribed=Value(True))
+                    .order_by('username'))
         page = self.paginate_queryset(queryset)
+        recipes = (Recipe.objects
+                   .filter(author__in=page)
+                   .limit_per_author(recipes_limit))
+        prefetch_related_objects(page, Prefetch(
+            'recipes',
+            queryset=recipes,
+            to_attr='recipes_preview'
+        ))
         serializer = SubscriptionSerializer(
             page,
             many=True,
@@ -38,85 +63,126 @@ class CastomUserViewSet(CreateDeleteMixin, UserViewSet):
         return self.get_paginated_response(serializer.data)
 
     @action(detail=True,
-            methods=['post', 'delete'],
+            methods=['post', 'put', 'delete'],
             permission_classes=(IsAuthenticated,))
     def subscribe(self, request, id):
-        if request.method == 'POST':
-            return self.create_obj(
-                SubscribeAuthorSerializer,
-                SubscriptionSerializer,
-                User,
-                request,
-                pk=id)
-        return self.delete_obj(Subscribe, user=request.user, author__id=id)
+        if request.method == 'DELETE':
+            return self.delete_obj(Subscribe, request, id)
+        get_recipes_limit(request)
+        if str(request.user.id) == str(id):
+            raise ValidationError({
+                api_settings.NON_FIELD_ERRORS_KEY:
+                    ['Нельзя подписаться на себя.']
+            })
+        return self.create_obj(Subscribe, SubscriptionSerializer,
+                               request, id)
 
 
-class IngredientViewSet(ModelViewSet):
+class IngredientViewSet(VersionedCacheMixin, ModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
-    permission_classes = (AllowAny, IsAuthorOrAdminOrReadOnly)
+    permission_classes = (IsAdminOrReadOnly,)
     filter_backends = (SearchIngredientFilter,)
     search_fields = ('^name',)
     pagination_class = None
 
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if name:
+            return HttpResponse(ingredient_index.search(name),
+                                content_type='application/json')
+        return super().list(request, *args, **kwargs)
+
 
-class TagViewSet(ModelViewSet):
+class TagViewSet(VersionedCacheMixin, ModelViewSet):
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
+    permission_classes = (IsAdminOrReadOnly,)
     pagination_class = None
 
 
-class RecipeViewSet(ModelViewSet, CreateDeleteMixin):
+class RecipeViewSet(AnonymousCacheMixin, CursorPaginationMixin, ModelViewSet,
+                    CreateDeleteMixin):
     queryset = Recipe.objects.all()
     serializer_class = RecipeCreateSerializer
     permission_classes = (IsAuthorOrAdminOrReadOnly,)
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (DjangoFilterBackend, RecipeOrderingFilter)
+    cursor_pagination_class = RecipeCursorPagination
     filterset_class = RecipeFilter
 
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            return (Recipe.objects.with_related()
+                    .with_user_flags(self.request.user))
+        return super().get_queryset()
+
+    @action(detail=False,
+            methods=['get'],
+            permission_classes=(IsAuthenticated,),
+            filter_backends=(),
+            pagination_class=FeedCursorPagination)
+    def feed(self, request):
+        page = self.paginate_queryset(MergedQuerySet(
+            queryset.with_related().with_user_flags(request.user)
+            for queryset in feed_querysets(request.user)
+        ))
+        serializer = RecipeCreateSerializer(
+            page,
+            many=True,
+            context={'request': request}
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(detail=True, methods=['get'])
+    def similar(self, request, pk):
+        recipe_id = self.get_target_id(pk)
+        recipes = list(Recipe.objects.filter(
+            similar_to__recipe_id=recipe_id
+        ).order_by('-similar_to__score', 'id'))
+        if not recipes and not Recipe.objects.filter(id=recipe_id).exists():
+            raise Http404
+        return Response(RecipeSerializer(
+            recipes, many=True, context={'request': request}
+        ).data)
+
     @action(detail=True,
-            methods=['post', 'delete'],
+            methods=['post', 'put', 'delete'],
             permission_classes=(IsAuthenticated,))
     def favorite(self, request, pk):
-        if request.method == 'POST':
-            return self.create_obj(FavoriteSerializer,
-                                   RecipeSerializer,
-                                   Recipe,
-                                   request,
-                                   pk)
-        return self.delete_obj(Favorite, user=request.user, recipe=pk)
-
-    @action(detail=True, methods=['post', 'delete'],
+        if request.method == 'DELETE':
+            return self.delete_obj(Favorite, request, pk)
+        return self.create_obj(Favorite, RecipeSerializer, request, pk)
+
+    @action(detail=True, methods=['post', 'put', 'delete'],
             permission_classes=[IsAuthenticated, ])
     def shopping_cart(self, request, pk):
-        if request.method == 'POST':
-            return self.create_obj(ShoppingCartSerializer,
-                                   RecipeSerializer,
-                                   Recipe,
-                                   request,
-                                   pk)
-        return self.delete_obj(ShoppingCart, user=request.user, recipe=pk)
+        if request.method == 'DELETE':
+            return self.delete_obj(ShoppingCart, request, pk)
+        return self.create_obj(ShoppingCart, RecipeSerializer, request, pk)
+
+    @action(detail=False,
+            methods=['post', 'delete'],
+            permission_classes=(IsAuthenticated,))
+    def bulk_favorite(self, request):
+        return self.bulk_obj(Favorite, request)
+
+    @action(detail=False,
+            methods=['post', 'delete'],
+            permission_classes=(IsAuthenticated,))
+    def bulk_shopping_cart(self, request):
+        return self.bulk_obj(ShoppingCart, request)
 
     @action(detail=False,
             methods=['get'],
-            permission_classes=(IsAuthenticated,)
-            )
+            permission_classes=(IsAuthenticated,),
+            renderer_classes=SHOPPING_CART_RENDERERS)
     def download_shopping_cart(self, request):
-        shopping_cart_recipes = (ShoppingCart.objects.
-                                 filter(user=request.user).
-                                 values_list('recipe', flat=True))
-        ingredients = (RecipeIngredient.objects
-                       .filter(recipe__in=shopping_cart_recipes)
-                       .values(name=F('ingredient__name'),
-                               unit=F('ingredient__measurement_unit'))
-                       .annotate(amount_sum=Sum('amount'))
-                       ).order_by('name')
-        shopping_cart = '\n'.join([
-            f'{ingredient["name"]} - {ingredient["unit"]} '
-            f'{ingredient["amount_sum"]}'
-            for ingredient in ingredients
-        ])
-        response = HttpResponse(content_type='text/plain')
-        response['Content-Disposition'] = ('attachment; '
-                                           'filename="shopping-cart.txt"')
-        response.write(shopping_cart)
+        export_format = request.accepted_renderer.format
+        response = StreamingHttpResponse(
+            export_shopping_cart(request.user, export_format),
+            content_type=request.accepted_renderer.media_type
+        )
+        response['Content-Disposition'] = (
+            f'attachment; filename="shopping-cart.{export_format}"'
+        )
         return response
@@ -0,0 +1,139 @@
+import os
+import time
+
+from django.db import connection
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+from foodgram.settings import SLOW_QUERIES
+from foodgram.slow_queries import log_slow_query
+
+# Если задан PROMETHEUS_MULTIPROC_DIR, каждый процесс gunicorn пишет
+# значения в свои файлы в этом каталоге, а /metrics суммирует их.
+MULTIPROCESS_DIR_VARIABLE = 'PROMETHEUS_MULTIPROC_DIR'
+LABELS = ('route', 'method')
+
+REQUEST_DURATION = Histogram(
+    'foodgram_request_duration_seconds',
+    'Время обработки запроса.',
+    LABELS,
+)
+QUERIES = Histogram(
+    'foodgram_request_queries',
+    'Число SQL-запросов за запрос.',
+    LABELS,
+    buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144),
+)
+QUERIES_DURATION = Histogram(
+    'foodgram_request_queries_duration_seconds',
+    'Суммарное время SQL-запросов за запрос.',
+    LABELS,
+    buckets=(.001, .0025, .005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5),
+)
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_size_bytes',
+    'Размер тела ответа.',
+    LABELS,
+    buckets=tuple(4 ** power for power in range(4, 13)),
+)
+RESPONSES = Counter(
+    'foodgram_responses',
+    'Ответы по коду статуса.',
+    (*LABELS, 'status'),
+)
+
+
+class QueryStats:
+    """Обёртка для connection.execute_wrapper: считает запросы
+    и их суммарное время и записывает медленные в журнал."""
+
+    def __init__(self, request):
+        self.request = request
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            result = execute(sql, params, many, context)
+        except Exception:
+            self.record(sql, params, many, context,
+                        time.perf_counter() - start, failed=True)
+            raise
+        self.record(sql, params, many, context, time.perf_counter() - start)
+        return result
+
+    def record(self, sql, params, many, context, duration, failed=False):
+        self.count += 1
+        self.duration += duration
+        if duration >= SLOW_QUERIES['THRESHOLD']:
+            log_slow_query(get_route(self.request), sql, params, many,
+                           duration, failed)
+
+
+def get_route(request):
+    """Имя маршрута, например recipe-list или user-subscriptions."""
+    match = getattr(request, 'resolver_match', None)
+    return match.view_name if match else 'unmatched'
+
+
+def observe(request, response, duration, stats, size):
+    labels = (get_route(request), request.method)
+    REQUEST_DURATION.labels(*labels).observe(duration)
+    QUERIES.labels(*labels).observe(stats.count)
+    QUERIES_DURATION.labels(*labels).observe(stats.duration)
+    RESPONSE_SIZE.labels(*labels).observe(size)
+    RESPONSES.labels(*labels, response.status_code).inc()
+
+
+class MetricsMiddleware:
+    """Время, SQL-запросы и размер ответа по каждому маршруту.
+
+    У потоковых ответов всё измеряется до конца передачи тела:
+    запросы к базе выполняются во время его чтения.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        stats = QueryStats(request)
+        start = time.perf_counter()
+        with connection.execute_wrapper(stats):
+            response = self.get_response(request)
+        if response.streaming:
+            response.streaming_content = self.stream(
+                request, response, response.streaming_content, start, stats
+            )
+        else:
+            observe(request, response, time.perf_counter() - start,
+                    stats, len(response.content))
+        return response
+
+    @staticmethod
+    def stream(request, response, content, start, stats):
+        size = 0
+        try:
+            with connection.execute_wrapper(stats):
+                for chunk in content:
+                    size += len(chunk)
+                    yield chunk
+        finally:
+            observe(request, response, time.perf_counter() - start,
+                    stats, size)
+
+
+def get_registry():
+    if MULTIPROCESS_DIR_VARIABLE not in os.environ:
+        return REGISTRY
+    registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(registry)
+    return registry
+
+
+def metrics(request):
+    """Метрики в текстовом формате Prometheus."""
+    return HttpResponse(generate_latest(get_registry()),
+                        content_type=CONTENT_TYPE_LATEST)
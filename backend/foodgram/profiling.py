@@ -0,0 +1,170 @@
+import cProfile
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+
+from django.utils import timezone
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.authentication import CachedTokenAuthentication
+from foodgram.metrics import get_route
+from foodgram.settings import PROFILING
+
+PROFILE_HEADER = 'HTTP_X_PROFILE'
+PROFILE_PARAM = 'profile'
+# Значение флага выбирает профилировщик; любое другое — cProfile.
+SAMPLING = 'sample'
+EXTENSIONS = {'cprofile': '.prof', SAMPLING: '.collapsed'}
+
+
+class StackSampler:
+    """Сэмплирующий профилировщик: раз в interval секунд снимает стек
+    потока запроса. Результат — свёрнутые стеки для flamegraph."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self.stacks = Counter()
+        self._stopped = threading.Event()
+        self._thread = None
+
+    def _run(self, thread_id):
+        while not self._stopped.wait(self.interval):
+            frame = sys._current_frames().get(thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} '
+                             f'({code.co_filename}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                self.stacks[';'.join(reversed(stack))] += 1
+
+    def enable(self):
+        self._thread = threading.Thread(
+            target=self._run, args=(threading.get_ident(),), daemon=True
+        )
+        self._thread.start()
+
+    def disable(self):
+        self._stopped.set()
+        self._thread.join()
+
+    def dump_stats(self, path):
+        with open(path, 'w', encoding='utf-8') as file:
+            for stack, count in self.stacks.items():
+                file.write(f'{stack} {count}\n')
+
+
+def get_profiler(kind):
+    if kind == SAMPLING:
+        return StackSampler(PROFILING['SAMPLE_INTERVAL'])
+    return cProfile.Profile()
+
+
+def is_staff(request):
+    """Сотрудник по сессии или по токену из заголовка Authorization."""
+    if getattr(request, 'user', None) and request.user.is_staff:
+        return True
+    try:
+        authenticated = CachedTokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        return False
+    return authenticated is not None and authenticated[0].is_staff
+
+
+def list_profiles():
+    """Сохранённые профили, от новых к старым."""
+    root = Path(PROFILING['ROOT'])
+    if not root.exists():
+        return []
+    return sorted(
+        (path for path in root.iterdir()
+         if path.suffix in EXTENSIONS.values()),
+        key=lambda path: path.stat().st_mtime,
+        reverse=True,
+    )
+
+
+def profile_name(request, kind, label):
+    route = get_route(request).replace(':', '-')
+    return (f'{timezone.now():%Y%m%d-%H%M%S-%f}-{route}-'
+            f'{request.method}-{label}'
+            + EXTENSIONS.get(kind, EXTENSIONS['cprofile']))
+
+
+def save_profile(profiler, name):
+    root = Path(PROFILING['ROOT'])
+    root.mkdir(parents=True, exist_ok=True)
+    profiler.dump_stats(root / name)
+    for path in list_profiles()[PROFILING['KEEP']:]:
+        path.unlink(missing_ok=True)
+
+
+class ProfiledStream:
+    """Тело потокового ответа, после выдачи которого вызывается
+    finish: профиль должен включать формирование всего тела."""
+
+    def __init__(self, content, finish):
+        self.content = content
+        self.finish = finish
+        self.finished = False
+
+    def __iter__(self):
+        try:
+            yield from self.content
+        finally:
+            self.close()
+
+    def close(self):
+        if not self.finished:
+            self.finished = True
+            self.finish()
+
+
+class ProfilingMiddleware:
+    """Профилирует запрос сотрудника с заголовком X-Profile или
+    параметром ?profile=: cProfile, а при значении sample —
+    сэмплирующим профилировщиком. Имя сохранённого файла
+    возвращается в заголовке X-Profile-Name; для потокового ответа
+    профиль сохраняется, когда тело выдано или ответ закрыт.
+
+    Запросы без флага проверяют только его наличие.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        kind = (request.META.get(PROFILE_HEADER)
+                or request.GET.get(PROFILE_PARAM))
+        if not kind or not is_staff(request):
+            return self.get_response(request)
+        profiler = get_profiler(kind)
+        start = time.perf_counter()
+        profiler.enable()
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profiler.disable()
+            raise
+        if response.streaming:
+            name = profile_name(request, kind, 'stream')
+
+            def finish():
+                profiler.disable()
+                save_profile(profiler, name)
+
+            response.streaming_content = ProfiledStream(
+                response.streaming_content, finish
+            )
+        else:
+            profiler.disable()
+            name = profile_name(
+                request, kind,
+                f'{(time.perf_counter() - start) * 1000:.0f}ms'
+            )
+            save_profile(profiler, name)
+        response['X-Profile-Name'] = name
+        return response
@@ -19,6 +19,12 @@ DEBUG = bool(strtobool(os.getenv('DEBUG', 'True')))
 ALLOWED_HOSTS = os.getenv('ALLOWED_HOSTS', 'localhost,127.0.0.1').split(',')
 
 DEFAULT_LIMIT = 20
+MAX_RECIPES_LIMIT = 100
+MAX_BULK_RECIPES = 100
+SEARCH_CONFIG = 'russian'
+SIMILAR_RECIPES_LIMIT = 10
+TRENDING_HALF_LIFE_DAYS = 3.5
+FEED_FANOUT_LIMIT = 10000
 
 # Application definition
 
@@ -39,11 +45,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.metrics.MetricsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'foodgram.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -83,6 +91,46 @@ DATABASES = {
     }
 }
 
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND',
+            'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+# Версии данных в кеше сбрасывают ответы и индексы во всех процессах
+# gunicorn и в фоновых обработчиках, поэтому вне отладки кеш должен
+# быть общим (проверка api.E001).
+REQUIRE_SHARED_CACHE = bool(strtobool(
+    os.getenv('REQUIRE_SHARED_CACHE', str(not DEBUG))
+))
+
+REFERENCE_CACHE_TIMEOUT = 60 * 60 * 24
+RESPONSE_CACHE_TIMEOUT = 60 * 10
+TOKEN_CACHE = {
+    'TIMEOUT': 60,
+    'LOCAL_SIZE': 1024,
+    'LOCAL_TIMEOUT': 5,
+}
+
+# Запросы дольше THRESHOLD секунд пишутся в LOG_FILE, для доли
+# EXPLAIN_RATE из них сохраняется SQL с плейсхолдерами: план строит
+# manage.py slowqueries --explain, а не запрос пользователя.
+# Параметры в них — токены, email и ввод пользователей, поэтому
+# пишутся только при LOG_PARAMS и со строками, заменёнными на '?'.
+SLOW_QUERIES = {
+    'THRESHOLD': float(os.getenv('SLOW_QUERY_THRESHOLD', 0.2)),
+    'EXPLAIN_RATE': float(os.getenv('SLOW_QUERY_EXPLAIN_RATE', 0.1)),
+    'LOG_PARAMS': bool(strtobool(os.getenv('SLOW_QUERY_LOG_PARAMS',
+                                           'False'))),
+    'LOG_FILE': os.getenv('SLOW_QUERY_LOG',
+                          BASE_DIR / 'logs' / 'slow_queries.log'),
+    'MAX_BYTES': 10 * 1024 * 1024,
+    'BACKUP_COUNT': 5,
+}
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -122,6 +170,14 @@ STATIC_ROOT = BASE_DIR / 'static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
+# Профили запросов сотрудников с X-Profile или ?profile=; не раздаются
+# как медиа и хранятся последние KEEP файлов.
+PROFILING = {
+    'ROOT': BASE_DIR / 'profiles',
+    'KEEP': 100,
+    'SAMPLE_INTERVAL': 0.001,
+}
+
 # Default primary key field type
 # https://docs.djangoproject.com/en/3.2/ref/settings/#default-auto-field
 
@@ -134,14 +190,14 @@ REST_FRAMEWORK = {
     ],
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'api.authentication.CachedTokenAuthentication',
     ],
 
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
 
-    'DEFAULT_PAGINATION_CLASS': 'rest_framework.pagination.PageNumberPagination',
+    'DEFAULT_PAGINATION_CLASS': 'api.pagination.PageLimitPagination',
     'PAGE_SIZE': 10,
 
 }
@@ -154,6 +210,8 @@ DJOSER = {
         'user_create': 'api.serializers.CustomUserCreateSerializer',
         'user_delete': 'djoser.serializers.UserDeleteSerializer',
         'current_user': 'djoser.serializers.UserSerializer',
+        'set_username': 'api.serializers.SetUsernameSerializer',
+        'username_reset_confirm': 'api.serializers.UsernameResetConfirmSerializer',
     },
     'PERMISSIONS': {
         'user': ['rest_framework.permissions.IsAuthenticated'],
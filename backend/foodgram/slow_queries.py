@@ -0,0 +1,151 @@
+import hashlib
+import itertools
+import json
+import logging
+import random
+import re
+from logging.handlers import RotatingFileHandler
+from pathlib import Path
+
+from django.db import DatabaseError, transaction
+from django.utils import timezone
+
+from foodgram.settings import SLOW_QUERIES
+
+EXPLAIN = 'EXPLAIN (ANALYZE, BUFFERS) '
+PLACEHOLDER = re.compile(r'%%|%s')
+REDACTED = '?'
+LOCKING = re.compile(r'\bFOR\s+(?:NO\s+KEY\s+|KEY\s+)?(?:UPDATE|SHARE)\b',
+                     re.IGNORECASE)
+
+NORMALIZE = (
+    (re.compile(r"'(?:[^']|'')*'"), '?'),
+    (re.compile(r'%s'), '?'),
+    (re.compile(r'\b\d+(?:\.\d+)?\b'), '?'),
+    (re.compile(r'\(\s*\?(?:\s*,\s*\?)+\s*\)'), '(...)'),
+    (re.compile(r'\s+'), ' '),
+)
+
+logger = logging.getLogger(__name__)
+
+
+def get_logger():
+    """Логгер с ротируемым файлом SLOW_QUERIES['LOG_FILE']."""
+    if not logger.handlers:
+        path = Path(SLOW_QUERIES['LOG_FILE'])
+        path.parent.mkdir(parents=True, exist_ok=True)
+        logger.addHandler(RotatingFileHandler(
+            path,
+            maxBytes=SLOW_QUERIES['MAX_BYTES'],
+            backupCount=SLOW_QUERIES['BACKUP_COUNT'],
+            encoding='utf-8',
+        ))
+    return logger
+
+
+def normalize(sql):
+    """Форма запроса: литералы и параметры заменены на ?,
+    списки параметров IN — на (...)."""
+    for pattern, replacement in NORMALIZE:
+        sql = pattern.sub(replacement, sql)
+    return sql.strip()
+
+
+def fingerprint(normalized):
+    return hashlib.sha1(normalized.encode()).hexdigest()[:16]
+
+
+def redact(params):
+    """Параметры без строк: строки заменены на '?', числа, даты
+    и NULL сохранены."""
+    def value(param):
+        if isinstance(param, (str, bytes, memoryview)):
+            return REDACTED
+        return param
+    if isinstance(params, dict):
+        return {name: value(param) for name, param in params.items()}
+    return [value(param) for param in params or ()]
+
+
+def generic_plan(cursor, sql):
+    """Общий план запроса без параметров: PREPARE и EXPLAIN EXECUTE
+    с NULL вместо параметров при force_generic_plan."""
+    numbers = itertools.count(1)
+    statement = PLACEHOLDER.sub(
+        lambda match: '%' if match[0] == '%%' else f'${next(numbers)}',
+        sql
+    )
+    count = next(numbers) - 1
+    cursor.execute('DEALLOCATE ALL')
+    cursor.execute('SET LOCAL plan_cache_mode = force_generic_plan')
+    cursor.execute(f'PREPARE slow_query AS {statement}')
+    cursor.execute('EXPLAIN EXECUTE slow_query({})'.format(
+        ', '.join(['NULL'] * count)
+    ))
+    return cursor.fetchall()
+
+
+def explain(connection, sql, params=None):
+    """План сохранённого запроса. С параметрами — EXPLAIN (ANALYZE,
+    BUFFERS): запрос выполняется заново в транзакции, которая
+    откатывается. Без параметров — общий план без выполнения."""
+    try:
+        with transaction.atomic(using=connection.alias):
+            with connection.cursor() as cursor:
+                if params is None:
+                    rows = generic_plan(cursor, sql)
+                else:
+                    cursor.execute(EXPLAIN + sql, params)
+                    rows = cursor.fetchall()
+                plan = '\n'.join(line for line, in rows)
+            transaction.set_rollback(True, using=connection.alias)
+    except DatabaseError as error:
+        return f'EXPLAIN не выполнен: {error}'
+    return plan
+
+
+def can_explain(sql, many):
+    """Для EXPLAIN сохраняются только одиночные SELECT без
+    блокировок строк и только для доли запросов."""
+    return (not many
+            and sql.lstrip()[:6].upper() == 'SELECT'
+            and not LOCKING.search(sql)
+            and random.random() < SLOW_QUERIES['EXPLAIN_RATE'])
+
+
+def log_slow_query(view, sql, params, many, duration, failed=False):
+    """Пишет медленный запрос JSON-строкой: время, представление,
+    форма запроса и, для части запросов, SQL для EXPLAIN
+    в manage.py slowqueries --explain. Параметры — только при
+    SLOW_QUERIES['LOG_PARAMS'] и без строк."""
+    normalized = normalize(sql)
+    entry = {
+        'time': timezone.now().isoformat(),
+        'duration': round(duration, 6),
+        'view': view,
+        'fingerprint': fingerprint(normalized),
+        'sql': normalized,
+    }
+    if failed:
+        entry['failed'] = True
+    elif can_explain(sql, many):
+        entry['query'] = sql
+        if SLOW_QUERIES['LOG_PARAMS']:
+            entry['params'] = redact(params)
+    get_logger().warning(json.dumps(entry, ensure_ascii=False, default=str))
+
+
+def read_entries(path):
+    """Записи из файла журнала и его архивов, от старых к новым."""
+    path = Path(path)
+    files = [path.with_name(f'{path.name}.{number}')
+             for number in range(SLOW_QUERIES['BACKUP_COUNT'], 0, -1)]
+    for file in (*files, path):
+        if not file.exists():
+            continue
+        with open(file, encoding='utf-8') as lines:
+            for line in lines:
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    continue
@@ -1,6 +1,9 @@
 from django.contrib import admin
 
+from recipes.images import IMAGE_PENDING
 from recipes.models import Tag, Recipe, Ingredient, RecipeIngredient, User
+from recipes.recipe_index import notify_recipes_changed
+from recipes.shopping_cart import update_recipe_in_totals
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -22,6 +25,26 @@ class TagAdmin(admin.ModelAdmin):
 class RecipeAdmin(admin.ModelAdmin):
     inlines = (RecipeIngredientInline, )
 
+    def save_model(self, request, obj, form, change):
+        if change and 'image' in form.changed_data:
+            for field, value in IMAGE_PENDING.items():
+                setattr(obj, field, value)
+        super().save_model(request, obj, form, change)
+
+    @staticmethod
+    def ingredient_amounts(recipe):
+        return dict(RecipeIngredient.objects.filter(
+            recipe=recipe
+        ).values_list('ingredient_id', 'amount'))
+
+    def save_related(self, request, form, formsets, change):
+        old_amounts = self.ingredient_amounts(form.instance)
+        super().save_related(request, form, formsets, change)
+        update_recipe_in_totals(form.instance, old_amounts,
+                                self.ingredient_amounts(form.instance))
+        Recipe.objects.filter(pk=form.instance.pk).update_search_vector()
+        notify_recipes_changed((form.instance.pk,))
+
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
@@ -0,0 +1,299 @@
+import io
+import json
+import random
+from collections import defaultdict
+from datetime import datetime, timedelta
+from itertools import islice
+
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.color import no_style
+from django.db import connection
+from django.db.models import Max
+from django.utils import timezone
+from faker import Faker
+from PIL import Image
+
+from foodgram.settings import FEED_FANOUT_LIMIT
+from recipes.models import (Favorite, FeedEntry, Ingredient, Recipe,
+                            RecipeIngredient, ShoppingCart,
+                            ShoppingCartIngredient, Tag)
+from recipes.shopping_cart import expected_cart_totals
+from users.models import Subscribe, User
+
+# Пользователи и теги, созданные seedbench, отличаются по домену
+# почты и префиксу slug.
+BENCH_DOMAIN = 'seedbench.test'
+BENCH_SLUG_PREFIX = 'bench-'
+BENCH_PASSWORD = 'seedbench'
+BENCH_IMAGE = 'recipes/seedbench.png'
+HISTORY = timedelta(days=365)
+CHUNK_SIZE = 50000
+COPY_ESCAPES = str.maketrans({
+    '\\': '\\\\', '\t': '\\t', '\n': '\\n', '\r': '\\r',
+})
+
+
+def copy_value(value):
+    """Значение в текстовом формате COPY."""
+    if value is None:
+        return '\\N'
+    if isinstance(value, bool):
+        return 't' if value else 'f'
+    if isinstance(value, (dict, list)):
+        value = json.dumps(value, ensure_ascii=False)
+    elif isinstance(value, datetime):
+        value = value.isoformat()
+    return str(value).translate(COPY_ESCAPES)
+
+
+def insert_objects(model, objects):
+    """Вставляет объекты с заданными id: COPY в PostgreSQL, иначе
+    executemany. save() и pre_save не вызываются, поэтому поля
+    auto_now_add сохраняют заданные даты. Возвращает число строк."""
+    fields = model._meta.concrete_fields
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = ', '.join(quote(field.column) for field in fields)
+    objects = iter(objects)
+    inserted = 0
+    with connection.cursor() as cursor:
+        while True:
+            chunk = list(islice(objects, CHUNK_SIZE))
+            if not chunk:
+                return inserted
+            if connection.vendor == 'postgresql':
+                buffer = io.StringIO()
+                for obj in chunk:
+                    buffer.write('\t'.join(
+                        copy_value(getattr(obj, field.attname))
+                        for field in fields
+                    ) + '\n')
+                buffer.seek(0)
+                cursor.copy_expert(f'COPY {table} ({columns}) FROM STDIN',
+                                   buffer)
+            else:
+                cursor.executemany(
+                    f'INSERT INTO {table} ({columns}) '
+                    f'VALUES ({", ".join(["%s"] * len(fields))})',
+                    [[field.get_db_prep_save(getattr(obj, field.attname),
+                                             connection)
+                      for field in fields]
+                     for obj in chunk]
+                )
+            inserted += len(chunk)
+
+
+def next_id(model):
+    return (model.objects.aggregate(last=Max('id'))['last'] or 0) + 1
+
+
+def reset_sequences(models):
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), models):
+            cursor.execute(sql)
+
+
+def skewed(rng, items, skew):
+    """Случайный элемент; при skew > 1 первые элементы выпадают чаще."""
+    return items[int(len(items) * rng.random() ** skew)]
+
+
+def unique_pairs(rng, count, users, targets, skew):
+    """До count разных пар (пользователь, цель), цели — со смещением
+    к популярным, без пар пользователя с самим собой."""
+    pairs = set()
+    for _ in range(count * 20):
+        if len(pairs) >= count:
+            break
+        user, target = rng.choice(users), skewed(rng, targets, skew)
+        if user != target:
+            pairs.add((user, target))
+    return pairs
+
+
+def ensure_image():
+    if not default_storage.exists(BENCH_IMAGE):
+        buffer = io.BytesIO()
+        Image.new('RGB', (64, 64), (200, 120, 60)).save(buffer, 'PNG')
+        default_storage.save(BENCH_IMAGE, ContentFile(buffer.getvalue()))
+
+
+def clear():
+    """Удаляет пользователей и теги прошлых запусков вместе
+    с их рецептами и связями."""
+    User.objects.filter(email__endswith='@' + BENCH_DOMAIN).delete()
+    Tag.objects.filter(slug__startswith=BENCH_SLUG_PREFIX).delete()
+
+
+class Seeder:
+    """Генератор пользователей, тегов, рецептов и связей между ними.
+
+    Ингредиенты берутся из справочника. Авторы, рецепты в избранном
+    и в корзинах выбираются со смещением к популярным; рецепт попадает
+    в избранное и корзины не раньше, чем опубликован.
+    """
+
+    def __init__(self, seed=0):
+        self.rng = random.Random(seed)
+        self.fake = Faker('ru_RU')
+        self.fake.seed_instance(seed)
+        self.now = timezone.now()
+        self.counts = {}
+
+    def past(self, since=None):
+        since = since or self.now - HISTORY
+        return since + (self.now - since) * self.rng.random()
+
+    def insert(self, model, objects, name=None):
+        name = name or str(model._meta.verbose_name_plural)
+        self.counts[name] = insert_objects(model, objects)
+
+    def users(self, count):
+        first = next_id(User)
+        password = make_password(BENCH_PASSWORD)
+        self.insert(User, (
+            User(id=user_id,
+                 username=f'{self.fake.user_name()}_{user_id}',
+                 email=f'user{user_id}@{BENCH_DOMAIN}',
+                 first_name=self.fake.first_name(),
+                 last_name=self.fake.last_name(),
+                 password=password,
+                 date_joined=self.past())
+            for user_id in range(first, first + count)
+        ))
+        return list(range(first, first + count))
+
+    def tags(self, count):
+        first = next_id(Tag)
+        used = set(Tag.objects.values_list('color', flat=True))
+        tags = []
+        for tag_id in range(first, first + count):
+            color = f'#{self.rng.randrange(0x1000000):06x}'
+            while color in used:
+                color = f'#{self.rng.randrange(0x1000000):06x}'
+            used.add(color)
+            tags.append(Tag(id=tag_id,
+                            name=f'{self.fake.word()} {tag_id}'[:100],
+                            color=color,
+                            slug=f'{BENCH_SLUG_PREFIX}{tag_id}'))
+        self.insert(Tag, tags)
+        return [tag.id for tag in tags]
+
+    def recipes(self, count, authors, tags, ingredients, min_ingredients,
+                max_ingredients):
+        """Рецепты с тегами и ингредиентами; возвращает
+        {id рецепта: (id автора, дата публикации)}."""
+        first = next_id(Recipe)
+        recipes = {
+            recipe_id: (skewed(self.rng, authors, 2), self.past())
+            for recipe_id in range(first, first + count)
+        }
+        self.insert(Recipe, (
+            Recipe(id=recipe_id,
+                   name=self.fake.sentence(nb_words=3)[:200],
+                   text=self.fake.paragraph(nb_sentences=5),
+                   cooking_time=self.rng.randint(5, 180),
+                   author_id=author_id,
+                   image=BENCH_IMAGE,
+                   image_processed=True,
+                   pub_date=pub_date)
+            for recipe_id, (author_id, pub_date) in recipes.items()
+        ))
+        through = Recipe.tags.through
+        tag_id = next_id(through)
+        recipe_tags = []
+        for recipe_id in recipes:
+            for tag in self.rng.sample(tags, min(len(tags),
+                                                 self.rng.randint(1, 3))):
+                recipe_tags.append(through(id=tag_id, recipe_id=recipe_id,
+                                           tag_id=tag))
+                tag_id += 1
+        self.insert(through, recipe_tags, 'Теги рецептов')
+        ingredient_id = next_id(RecipeIngredient)
+        recipe_ingredients = []
+        for recipe_id in recipes:
+            size = min(len(ingredients),
+                       self.rng.randint(min_ingredients, max_ingredients))
+            chosen = set()
+            while len(chosen) < size:
+                chosen.add(skewed(self.rng, ingredients, 1.5))
+            for ingredient in chosen:
+                recipe_ingredients.append(RecipeIngredient(
+                    id=ingredient_id, recipe_id=recipe_id,
+                    ingredient_id=ingredient,
+                    amount=self.rng.randint(1, 500)
+                ))
+                ingredient_id += 1
+        self.insert(RecipeIngredient, recipe_ingredients)
+        return recipes
+
+    def relations(self, model, count, users, recipes):
+        relation_id = next_id(model)
+        pairs = unique_pairs(self.rng, count, users, list(recipes), 3)
+        self.insert(model, (
+            model(id=relation_id + number, user_id=user_id,
+                  recipe_id=recipe_id,
+                  created=self.past(recipes[recipe_id][1]))
+            for number, (user_id, recipe_id) in enumerate(sorted(pairs))
+        ))
+
+    def subscriptions(self, count, users, recipes):
+        """Подписки и ленты подписчиков, как их заполнил бы fan_out."""
+        first = next_id(Subscribe)
+        pairs = sorted(unique_pairs(self.rng, count, users, users, 3))
+        self.insert(Subscribe, (
+            Subscribe(id=first + number, user_id=user_id,
+                      author_id=author_id)
+            for number, (user_id, author_id) in enumerate(pairs)
+        ))
+        by_author = defaultdict(list)
+        for recipe_id, (author_id, pub_date) in recipes.items():
+            by_author[author_id].append((recipe_id, pub_date))
+        subscribers = defaultdict(int)
+        for _, author_id in pairs:
+            subscribers[author_id] += 1
+        entry_id = next_id(FeedEntry)
+        entries = []
+        for user_id, author_id in pairs:
+            if subscribers[author_id] > FEED_FANOUT_LIMIT:
+                continue
+            for recipe_id, pub_date in by_author[author_id]:
+                entries.append(FeedEntry(
+                    id=entry_id, user_id=user_id, recipe_id=recipe_id,
+                    author_id=author_id, pub_date=pub_date
+                ))
+                entry_id += 1
+        self.insert(FeedEntry, entries)
+
+    def cart_totals(self, user_ids):
+        """Итоги корзин новых пользователей, как их вёл бы
+        add_recipe_to_totals."""
+        first = next_id(ShoppingCartIngredient)
+        totals = expected_cart_totals(user_ids)
+        self.insert(ShoppingCartIngredient, (
+            ShoppingCartIngredient(id=first + number, user_id=user_id,
+                                   ingredient_id=ingredient_id,
+                                   amount=amount)
+            for number, ((user_id, ingredient_id), amount)
+            in enumerate(totals.items())
+        ))
+
+    def seed(self, users, tags, recipes, favorites, carts, subscriptions,
+             min_ingredients, max_ingredients):
+        ingredients = list(Ingredient.objects.values_list('id', flat=True))
+        self.rng.shuffle(ingredients)
+        ensure_image()
+        user_ids = self.users(users)
+        tag_ids = self.tags(tags)
+        recipe_rows = self.recipes(recipes, user_ids, tag_ids, ingredients,
+                                   min_ingredients, max_ingredients)
+        self.relations(Favorite, favorites, user_ids, recipe_rows)
+        self.relations(ShoppingCart, carts, user_ids, recipe_rows)
+        self.subscriptions(subscriptions, user_ids, recipe_rows)
+        self.cart_totals(user_ids)
+        reset_sequences((User, Tag, Recipe, Recipe.tags.through,
+                         RecipeIngredient, Favorite, ShoppingCart,
+                         Subscribe, FeedEntry, ShoppingCartIngredient))
+        return list(recipe_rows)
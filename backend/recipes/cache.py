@@ -0,0 +1,65 @@
+from django.core.cache import cache
+from django.db import transaction
+
+from recipes.models import Recipe, RecipeRanking
+
+RECIPES = Recipe._meta.label_lower
+# Состав и порядок списков рецептов: создание, удаление и правка
+# полей, по которым фильтруют и сортируют.
+RECIPE_LIST = f'{RECIPES}:list'
+RANKINGS = RecipeRanking._meta.label_lower
+
+
+def version_key(namespace):
+    return f'{namespace}:version'
+
+
+def get_version(namespace):
+    """Текущая версия данных namespace; меняется при каждом изменении."""
+    return cache.get(version_key(namespace), 0)
+
+
+def get_versions(namespaces):
+    """Текущие версии нескольких namespace одним запросом к кешу."""
+    found = cache.get_many([version_key(namespace)
+                            for namespace in namespaces])
+    return {namespace: found.get(version_key(namespace), 0)
+            for namespace in namespaces}
+
+
+def bump_version(namespace):
+    """Увеличивает версию namespace и возвращает новую."""
+    key = version_key(namespace)
+    if cache.add(key, 1, timeout=None):
+        return 1
+    try:
+        return cache.incr(key)
+    except ValueError:
+        cache.set(key, 1, timeout=None)
+        return 1
+
+
+def object_namespace(model, pk):
+    return f'{model._meta.label_lower}:{pk}'
+
+
+def invalidate(namespaces):
+    """Меняет версии после фиксации транзакции, чтобы ответ,
+    построенный по старым данным, не сохранился под новой версией."""
+    namespaces = frozenset(namespaces)
+    transaction.on_commit(
+        lambda: [bump_version(namespace) for namespace in namespaces]
+    )
+
+
+def invalidate_objects(model, pks):
+    invalidate(object_namespace(model, pk) for pk in pks)
+
+
+def invalidate_recipes(recipe_ids, listing=True):
+    """Сбрасывает ответы с рецептами recipe_ids, а при listing —
+    и все списки рецептов."""
+    namespaces = [object_namespace(Recipe, pk) for pk in recipe_ids]
+    if listing:
+        namespaces.append(RECIPE_LIST)
+    invalidate(namespaces)
@@ -0,0 +1,128 @@
+import logging
+import os
+from datetime import timedelta
+from io import BytesIO
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils import timezone
+from PIL import Image, ImageOps
+
+from recipes.cache import invalidate_objects
+
+from recipes.models import Recipe
+
+logger = logging.getLogger(__name__)
+
+VARIANTS_DIR = 'recipes/variants/'
+VARIANT_SIZES = {
+    'thumbnail': 160,
+    'card': 480,
+    'full': 1200,
+}
+VARIANT_FORMATS = {
+    'jpeg': 'JPEG',
+    'webp': 'WEBP',
+}
+QUALITY = 85
+CLAIM_TIMEOUT = timedelta(minutes=10)
+MAX_ATTEMPTS = 5
+# Поля рецепта, которые ставят новое изображение в очередь обработки.
+IMAGE_PENDING = {
+    'image_processed': False,
+    'image_claimed_at': None,
+    'image_attempts': 0,
+}
+
+
+def save_variant(image, name, image_format):
+    if image_format == 'JPEG' and image.mode != 'RGB':
+        image = image.convert('RGB')
+    buffer = BytesIO()
+    image.save(buffer, image_format, quality=QUALITY)
+    return default_storage.save(name, ContentFile(buffer.getvalue()))
+
+
+def build_variants(image_name):
+    """Уменьшенные копии изображения во всех форматах:
+    {размер: {формат: путь в хранилище}}."""
+    stem = os.path.splitext(os.path.basename(image_name))[0]
+    variants = {}
+    with default_storage.open(image_name) as source:
+        with Image.open(source) as original:
+            original = ImageOps.exif_transpose(original)
+            if original.mode not in ('RGB', 'RGBA'):
+                original = original.convert('RGBA')
+            for size_name, size in VARIANT_SIZES.items():
+                resized = original.copy()
+                resized.thumbnail((size, size))
+                variants[size_name] = {
+                    extension: save_variant(
+                        resized,
+                        f'{VARIANTS_DIR}{stem}_{size_name}.{extension}',
+                        image_format
+                    )
+                    for extension, image_format in VARIANT_FORMATS.items()
+                }
+    return variants
+
+
+def delete_variants(variants):
+    for formats in variants.values():
+        for name in formats.values():
+            default_storage.delete(name)
+
+
+def claim_pending_images(batch_size):
+    """Берёт до batch_size рецептов с необработанными изображениями
+    в короткой транзакции. Взятый рецепт другие обработчики не трогают
+    CLAIM_TIMEOUT; после ошибки или падения обработчика он снова
+    попадает в очередь, пока попыток меньше MAX_ATTEMPTS."""
+    now = timezone.now()
+    with transaction.atomic():
+        recipes = list(
+            Recipe.objects.select_for_update(skip_locked=True)
+            .filter(image_processed=False, image_attempts__lt=MAX_ATTEMPTS)
+            .filter(Q(image_claimed_at__isnull=True)
+                    | Q(image_claimed_at__lt=now - CLAIM_TIMEOUT))
+            .only('id', 'image', 'image_variants')
+            .order_by('id')[:batch_size]
+        )
+        Recipe.objects.filter(pk__in=[recipe.pk for recipe in recipes]).update(
+            image_claimed_at=now, image_attempts=F('image_attempts') + 1
+        )
+    for recipe in recipes:
+        recipe.image_claimed_at = now
+    return recipes
+
+
+def process_recipe_image(recipe):
+    """Строит копии изображения вне транзакции и сохраняет их, если
+    изображение не сменилось и рецепт всё ещё взят этим обработчиком."""
+    try:
+        variants = build_variants(recipe.image.name)
+    except (OSError, ValueError):
+        logger.exception('Не удалось обработать изображение %s',
+                         recipe.image.name)
+        return
+    updated = Recipe.objects.filter(
+        pk=recipe.pk, image=recipe.image.name,
+        image_claimed_at=recipe.image_claimed_at,
+    ).update(image_variants=variants, image_processed=True,
+             image_claimed_at=None, image_attempts=0)
+    if not updated:
+        delete_variants(variants)
+        return
+    invalidate_objects(Recipe, (recipe.pk,))
+    delete_variants(recipe.image_variants)
+
+
+def process_pending_images(batch_size):
+    """Обрабатывает до batch_size рецептов с новыми изображениями.
+    Параллельные обработчики берут разные рецепты."""
+    recipes = claim_pending_images(batch_size)
+    for recipe in recipes:
+        process_recipe_image(recipe)
+    return len(recipes)
@@ -0,0 +1,87 @@
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import override_settings
+from rest_framework.test import APIClient
+
+from recipes.models import RecipeIngredient
+from recipes.recipe_index import recipe_index, sql_coverage
+from users.models import User
+
+
+def timed(func, *args):
+    start = time.perf_counter()
+    result = func(*args)
+    return result, (time.perf_counter() - start) * 1000
+
+
+class Command(BaseCommand):
+    help = ('Сравнение подбора рецептов по ингредиентам: индекс, SQL '
+            'и запрос к API целиком')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients', type=int, default=5)
+        parser.add_argument('--queries', type=int, default=50)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--limit', type=int, default=6)
+
+    def report(self, name, timings):
+        timings = sorted(timings)
+        self.stdout.write(
+            f'{name}: median {statistics.median(timings):.2f} ms, '
+            f'p95 {timings[int(len(timings) * 0.95) - 1]:.2f} ms, '
+            f'max {timings[-1]:.2f} ms'
+        )
+
+    def handle(self, *args, **options):
+        used = sorted(set(RecipeIngredient.objects.values_list(
+            'ingredient_id', flat=True
+        )))
+        if not used:
+            raise CommandError('Нет рецептов с ингредиентами')
+        rng = random.Random(options['seed'])
+        queries = [
+            rng.sample(used, min(options['ingredients'], len(used)))
+            for _ in range(options['queries'])
+        ]
+        _, build = timed(recipe_index.coverage, ())
+        self.stdout.write(f'Построение индекса: {build:.2f} ms')
+        index_timings, sql_timings = [], []
+        for ingredient_ids in queries:
+            expected, elapsed = timed(sql_coverage, ingredient_ids)
+            sql_timings.append(elapsed)
+            actual, elapsed = timed(recipe_index.coverage, ingredient_ids)
+            index_timings.append(elapsed)
+            if actual != expected:
+                raise CommandError(
+                    f'Результаты расходятся для {ingredient_ids}'
+                )
+        self.report('Индекс', index_timings)
+        self.report('SQL', sql_timings)
+        self.report('API', self.request_timings(queries, options['limit']))
+
+    def request_timings(self, queries, limit):
+        """Время GET /api/recipes/?ingredients= от фильтра до ответа.
+
+        Запросы идут от пользователя: ответы анонимам кешируются.
+        """
+        client = APIClient()
+        user = User.objects.order_by('id').first()
+        if user is not None:
+            client.force_authenticate(user)
+        timings = []
+        # Тестовый клиент ходит на хост testserver.
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            for ingredient_ids in queries:
+                response, elapsed = timed(client.get, '/api/recipes/', {
+                    'ingredients': ','.join(map(str, ingredient_ids)),
+                    'limit': limit,
+                })
+                if response.status_code != 200:
+                    raise CommandError(
+                        f'Ответ {response.status_code} для {ingredient_ids}'
+                    )
+                timings.append(elapsed)
+        return timings
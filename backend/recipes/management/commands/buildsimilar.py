@@ -0,0 +1,29 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from foodgram.settings import SIMILAR_RECIPES_LIMIT
+from recipes.similarity import METRICS, rebuild_neighbours
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт похожих рецептов по ингредиентам и тегам'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--k', type=int, default=SIMILAR_RECIPES_LIMIT)
+        parser.add_argument('--metric', choices=METRICS, default='jaccard')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Рецептов в одном блоке расчёта',
+        )
+
+    def handle(self, *args, **options):
+        start = time.perf_counter()
+        saved = rebuild_neighbours(
+            options['k'], options['metric'], options['batch_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f'Сохранено пар: {saved} за '
+            f'{time.perf_counter() - start:.1f} с'
+        ))
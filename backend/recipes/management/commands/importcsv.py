@@ -3,6 +3,7 @@ import os
 from django.core.management.base import BaseCommand
 
 from foodgram.settings import BASE_DIR
+from recipes.cache import bump_version
 from recipes.models import Ingredient
 
 
@@ -27,3 +28,4 @@ class Command(BaseCommand):
                                             measurement_unit=unit))
                 object_id += 1
         Ingredient.objects.bulk_create(temp_data, batch_size=500)
+        bump_version(Ingredient._meta.label_lower)
@@ -0,0 +1,33 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.images import process_pending_images
+
+
+class Command(BaseCommand):
+    help = 'Фоновая обработка изображений рецептов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=20)
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5,
+            help='Пауза между проверками, если очередь пуста (секунды)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обработать очередь и завершиться',
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            processed = process_pending_images(options['batch_size'])
+            if processed:
+                self.stdout.write(f'Обработано изображений: {processed}')
+                continue
+            if options['once']:
+                return
+            time.sleep(options['interval'])
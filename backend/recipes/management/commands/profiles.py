@@ -0,0 +1,49 @@
+import io
+import pstats
+from datetime import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+
+from foodgram.profiling import list_profiles
+
+
+class Command(BaseCommand):
+    help = 'Последние профили запросов или статистика одного из них'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=20)
+        parser.add_argument(
+            '--stats',
+            metavar='NAME',
+            help='Показать самые дорогие функции профиля .prof',
+        )
+        parser.add_argument(
+            '--sort',
+            default='cumulative',
+            help='Сортировка для --stats, например tottime',
+        )
+        parser.add_argument('--lines', type=int, default=30)
+
+    def handle(self, *args, **options):
+        profiles = list_profiles()
+        if options['stats']:
+            found = [path for path in profiles
+                     if path.name == options['stats']]
+            if not found or found[0].suffix != '.prof':
+                raise CommandError(
+                    f'Профиль .prof {options["stats"]} не найден'
+                )
+            output = io.StringIO()
+            stats = pstats.Stats(str(found[0]), stream=output)
+            stats.sort_stats(options['sort']).print_stats(options['lines'])
+            self.stdout.write(output.getvalue())
+            return
+        if not profiles:
+            self.stdout.write('Профилей нет')
+            return
+        for path in profiles[:options['limit']]:
+            stat = path.stat()
+            modified = datetime.fromtimestamp(stat.st_mtime)
+            self.stdout.write(
+                f'{modified:%Y-%m-%d %H:%M:%S}  {stat.st_size:>9}  {path}'
+            )
@@ -0,0 +1,52 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from recipes.models import ShoppingCartIngredient
+from recipes.shopping_cart import expected_cart_totals
+
+
+class Command(BaseCommand):
+    help = 'Проверка и пересборка итогов списков покупок'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только найти расхождения, ничего не меняя',
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            expected = expected_cart_totals()
+            actual = {
+                (user_id, ingredient_id): amount
+                for user_id, ingredient_id, amount
+                in ShoppingCartIngredient.objects.select_for_update()
+                .values_list('user', 'ingredient', 'amount')
+            }
+            drift = {
+                key for key in expected.keys() | actual.keys()
+                if expected.get(key) != actual.get(key)
+            }
+            for user_id, ingredient_id in sorted(drift):
+                self.stdout.write(
+                    f'user={user_id} ingredient={ingredient_id}: '
+                    f'{actual.get((user_id, ingredient_id))} -> '
+                    f'{expected.get((user_id, ingredient_id))}'
+                )
+            if options['check']:
+                if drift:
+                    raise CommandError(f'Расхождений: {len(drift)}')
+                self.stdout.write(self.style.SUCCESS('Расхождений нет'))
+                return
+            ShoppingCartIngredient.objects.all().delete()
+            ShoppingCartIngredient.objects.bulk_create(
+                (ShoppingCartIngredient(user_id=user_id,
+                                        ingredient_id=ingredient_id,
+                                        amount=amount)
+                 for (user_id, ingredient_id), amount in expected.items()),
+                batch_size=1000
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Итоги пересобраны, исправлено: {len(drift)}'
+        ))
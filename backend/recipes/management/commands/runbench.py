@@ -0,0 +1,224 @@
+import json
+import math
+import random
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext, override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+
+from recipes.bench import BENCH_DOMAIN
+from recipes.models import Ingredient, Recipe, Tag
+from users.models import User
+
+USERS_SAMPLE = 50
+
+
+def percentile(timings, share):
+    """Перцентиль по рангу из отсортированного списка."""
+    return timings[max(0, math.ceil(share * len(timings)) - 1)]
+
+
+class Bench:
+    """Клиенты и случайные параметры для сценариев."""
+
+    def __init__(self, seed):
+        self.rng = random.Random(seed)
+        self.anonymous = APIClient()
+        user_ids = list(User.objects.filter(
+            email__endswith='@' + BENCH_DOMAIN
+        ).values_list('id', flat=True))
+        users = User.objects.filter(id__in=self.rng.sample(
+            user_ids, min(USERS_SAMPLE, len(user_ids))
+        ))
+        if not users:
+            raise CommandError('Нет данных seedbench, '
+                               'сначала выполните seedbench')
+        self.clients = []
+        for user in users:
+            client = APIClient()
+            token, _ = Token.objects.get_or_create(user=user)
+            client.credentials(HTTP_AUTHORIZATION=f'Token {token.key}')
+            self.clients.append(client)
+        self.authors = [user.id for user in users]
+        self.recipe_ids = list(Recipe.objects.values_list('id', flat=True))
+        self.tags = list(Tag.objects.values_list('slug', flat=True))
+        self.ingredients = list(Ingredient.objects.filter(
+            recipes__isnull=False
+        ).values_list('id', 'name').distinct()[:500])
+        self.words = [
+            word for name in Recipe.objects.values_list(
+                'name', flat=True
+            )[:200] for word in name.split() if len(word) > 3
+        ]
+
+    @property
+    def client(self):
+        return self.rng.choice(self.clients)
+
+    @property
+    def recipe_id(self):
+        return self.rng.choice(self.recipe_ids)
+
+    def recipes_anonymous(self):
+        return [self.anonymous.get(
+            f'/api/recipes/?page={self.rng.randint(1, 5)}'
+        )]
+
+    def recipes_filtered(self):
+        tags = '&'.join(f'tags={slug}'
+                        for slug in self.rng.sample(self.tags, 2))
+        flag = self.rng.choice(('is_favorited', 'is_in_shopping_cart'))
+        return [self.client.get(f'/api/recipes/?{tags}&{flag}=1')]
+
+    def recipes_author(self):
+        return [self.client.get(
+            f'/api/recipes/?author={self.rng.choice(self.authors)}'
+        )]
+
+    def recipes_search(self):
+        return [self.client.get(
+            f'/api/recipes/?search={self.rng.choice(self.words)}'
+        )]
+
+    def recipes_ingredients(self):
+        ids = [ingredient_id for ingredient_id, _ in self.rng.sample(
+            self.ingredients, min(5, len(self.ingredients))
+        )]
+        return [self.client.get(
+            f'/api/recipes/?ingredients={",".join(map(str, ids))}'
+        )]
+
+    def recipes_cursor(self):
+        ordering = self.rng.choice(('newest', 'popular', 'trending'))
+        return [self.client.get(
+            f'/api/recipes/?pagination=cursor&ordering={ordering}'
+        )]
+
+    def recipe_detail(self):
+        return [self.client.get(f'/api/recipes/{self.recipe_id}/')]
+
+    def recipe_similar(self):
+        return [self.anonymous.get(
+            f'/api/recipes/{self.recipe_id}/similar/'
+        )]
+
+    def feed(self):
+        return [self.client.get('/api/recipes/feed/')]
+
+    def subscriptions(self):
+        return [self.client.get(
+            '/api/users/subscriptions/?recipes_limit=3'
+        )]
+
+    def shopping_cart(self):
+        response = self.client.get('/api/recipes/download_shopping_cart/')
+        b''.join(response.streaming_content)
+        return [response]
+
+    def favorite(self):
+        """Добавление в избранное и удаление, чтобы данные
+        не менялись."""
+        client, recipe_id = self.client, self.recipe_id
+        added = client.put(f'/api/recipes/{recipe_id}/favorite/')
+        removed = client.delete(f'/api/recipes/{recipe_id}/favorite/')
+        return [added, removed]
+
+    def ingredients_search(self):
+        _, name = self.rng.choice(self.ingredients)
+        return [self.anonymous.get(f'/api/ingredients/?name={name[:3]}')]
+
+    def tags_list(self):
+        return [self.anonymous.get('/api/tags/')]
+
+    def users_me(self):
+        return [self.client.get('/api/users/me/')]
+
+
+SCENARIOS = {
+    'recipes-anonymous': Bench.recipes_anonymous,
+    'recipes-filtered': Bench.recipes_filtered,
+    'recipes-author': Bench.recipes_author,
+    'recipes-search': Bench.recipes_search,
+    'recipes-ingredients': Bench.recipes_ingredients,
+    'recipes-cursor': Bench.recipes_cursor,
+    'recipe-detail': Bench.recipe_detail,
+    'recipe-similar': Bench.recipe_similar,
+    'feed': Bench.feed,
+    'subscriptions': Bench.subscriptions,
+    'shopping-cart': Bench.shopping_cart,
+    'favorite': Bench.favorite,
+    'ingredients-search': Bench.ingredients_search,
+    'tags': Bench.tags_list,
+    'users-me': Bench.users_me,
+}
+
+
+class Command(BaseCommand):
+    help = ('Прогон основных сценариев API через тестовый клиент: '
+            'p50/p95/p99, число запросов к базе и пропускная способность')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=100,
+                            help='Повторов каждого сценария')
+        parser.add_argument('--warmup', type=int, default=5)
+        parser.add_argument('--scenario', action='append',
+                            choices=SCENARIOS,
+                            help='Только эти сценарии; можно повторять')
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести результаты в JSON')
+
+    def run(self, bench, scenario, repeats, warmup):
+        for _ in range(warmup):
+            scenario(bench)
+        timings, queries, errors = [], [], 0
+        for _ in range(repeats):
+            with CaptureQueriesContext(connection) as captured:
+                start = time.perf_counter()
+                responses = scenario(bench)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries.append(len(captured))
+            errors += any(response.status_code >= 400
+                          for response in responses)
+        timings.sort()
+        return {
+            'requests': repeats,
+            'errors': errors,
+            'p50_ms': round(percentile(timings, 0.5), 2),
+            'p95_ms': round(percentile(timings, 0.95), 2),
+            'p99_ms': round(percentile(timings, 0.99), 2),
+            'mean_queries': round(statistics.mean(queries), 2),
+            'max_queries': max(queries),
+            'rps': round(repeats / (sum(timings) / 1000), 1),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:<20} p50 {result["p50_ms"]:>8.2f} ms  '
+            f'p95 {result["p95_ms"]:>8.2f} ms  '
+            f'p99 {result["p99_ms"]:>8.2f} ms  '
+            f'запросов {result["mean_queries"]:>6.1f} '
+            f'(макс. {result["max_queries"]})  '
+            f'{result["rps"]:>7.1f} rps  '
+            f'ошибок {result["errors"]}'
+        )
+
+    def handle(self, *args, **options):
+        if options['requests'] < 1:
+            raise CommandError('Нужен хотя бы один повтор')
+        results = {}
+        # Тестовый клиент ходит на хост testserver.
+        with override_settings(ALLOWED_HOSTS=['testserver']):
+            bench = Bench(options['seed'])
+            for name in options['scenario'] or SCENARIOS:
+                results[name] = self.run(bench, SCENARIOS[name],
+                                         options['requests'],
+                                         options['warmup'])
+                if not options['json']:
+                    self.report(name, results[name])
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
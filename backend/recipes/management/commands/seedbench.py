@@ -0,0 +1,86 @@
+import time
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from foodgram.settings import SIMILAR_RECIPES_LIMIT
+from recipes.bench import BENCH_PASSWORD, Seeder, clear
+from recipes.cache import RECIPE_LIST, bump_version
+from recipes.models import Ingredient, Recipe, Tag
+from recipes.ranking import refresh_rankings
+from recipes.recipe_index import NAMESPACE as RECIPE_INDEX_NAMESPACE
+from recipes.similarity import rebuild_neighbours
+
+
+class Command(BaseCommand):
+    help = ('Генерация пользователей, рецептов и связей для нагрузочных '
+            'тестов; ингредиенты берутся из справочника (importcsv)')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--tags', type=int, default=10)
+        parser.add_argument('--recipes', type=int, default=10000)
+        parser.add_argument('--favorites', type=int, default=50000)
+        parser.add_argument('--carts', type=int, default=20000)
+        parser.add_argument('--subscriptions', type=int, default=20000)
+        parser.add_argument('--min-ingredients', type=int, default=3)
+        parser.add_argument('--max-ingredients', type=int, default=12)
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument(
+            '--clear',
+            action='store_true',
+            help='Удалить данные прошлых запусков seedbench',
+        )
+        parser.add_argument(
+            '--similar',
+            action='store_true',
+            help='Пересчитать похожие рецепты (buildsimilar)',
+        )
+
+    def step(self, message, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.stdout.write(
+                f'{message}: {time.perf_counter() - start:.1f} с'
+            )
+
+    def handle(self, *args, **options):
+        if not Ingredient.objects.exists():
+            raise CommandError('Справочник ингредиентов пуст, '
+                               'сначала выполните importcsv')
+        if options['users'] < 2 or options['tags'] < 1:
+            raise CommandError('Нужно минимум 2 пользователя и 1 тег')
+        if options['clear']:
+            self.step('Удаление прошлых данных', clear)
+        seeder = Seeder(options['seed'])
+        with transaction.atomic():
+            recipe_ids = self.step(
+                'Генерация', seeder.seed,
+                options['users'], options['tags'], options['recipes'],
+                options['favorites'], options['carts'],
+                options['subscriptions'], options['min_ingredients'],
+                options['max_ingredients'],
+            )
+        for name, count in seeder.counts.items():
+            self.stdout.write(f'  {name}: {count}')
+        self.step('Счётчики', call_command, 'recount', stdout=self.stdout)
+        if recipe_ids:
+            self.step(
+                'Поисковые векторы',
+                Recipe.objects.filter(
+                    id__gte=recipe_ids[0]
+                ).update_search_vector
+            )
+        self.step('Рейтинги', refresh_rankings, True)
+        if options['similar']:
+            self.step('Похожие рецепты', rebuild_neighbours,
+                      SIMILAR_RECIPES_LIMIT)
+        for namespace in (RECIPE_INDEX_NAMESPACE, RECIPE_LIST,
+                          Tag._meta.label_lower):
+            bump_version(namespace)
+        self.stdout.write(self.style.SUCCESS(
+            f'Готово. Пароль пользователей: {BENCH_PASSWORD}'
+        ))
@@ -0,0 +1,74 @@
+from collections import Counter
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+
+from foodgram.settings import SLOW_QUERIES
+from foodgram.slow_queries import explain, read_entries
+
+
+class Command(BaseCommand):
+    help = 'Самые дорогие формы медленных запросов по суммарному времени'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--top', type=int, default=10)
+        parser.add_argument(
+            '--view',
+            help='Только запросы этого представления, например recipe-list',
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Выполнить EXPLAIN последнего сохранённого запроса '
+                 'каждой формы: ANALYZE, если сохранены параметры, '
+                 'иначе общий план (только PostgreSQL)',
+        )
+        parser.add_argument('--file', default=SLOW_QUERIES['LOG_FILE'])
+
+    def handle(self, *args, **options):
+        shapes = {}
+        for entry in read_entries(options['file']):
+            if options['view'] and entry['view'] != options['view']:
+                continue
+            shape = shapes.setdefault(entry['fingerprint'], {
+                'sql': entry['sql'],
+                'count': 0,
+                'total': 0.0,
+                'max': 0.0,
+                'views': Counter(),
+                'sample': None,
+            })
+            shape['count'] += 1
+            shape['total'] += entry['duration']
+            shape['max'] = max(shape['max'], entry['duration'])
+            shape['views'][entry['view']] += 1
+            if 'query' in entry:
+                shape['sample'] = (entry['query'], entry.get('params'))
+        if not shapes:
+            self.stdout.write('Медленных запросов нет')
+            return
+        worst = sorted(shapes.items(), key=lambda item: -item[1]['total'])
+        for fingerprint, shape in worst[:options['top']]:
+            views = ', '.join(
+                f'{view} ({count})'
+                for view, count in shape['views'].most_common()
+            )
+            self.stdout.write(
+                f'{fingerprint}: всего {shape["total"]:.3f} s, '
+                f'{shape["count"]} раз, '
+                f'в среднем {shape["total"] / shape["count"] * 1000:.1f} ms, '
+                f'максимум {shape["max"] * 1000:.1f} ms\n'
+                f'  представления: {views}\n'
+                f'  {shape["sql"]}'
+            )
+            if options['explain']:
+                self.explain(shape['sample'])
+
+    def explain(self, sample):
+        if connection.vendor != 'postgresql':
+            plan = 'EXPLAIN выполняется только в PostgreSQL'
+        elif sample is None:
+            plan = 'Нет сохранённого запроса'
+        else:
+            plan = explain(connection, *sample)
+        self.stdout.write('  ' + plan.replace('\n', '\n  '))
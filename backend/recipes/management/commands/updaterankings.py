@@ -0,0 +1,38 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from recipes.ranking import refresh_rankings
+
+
+class Command(BaseCommand):
+    help = 'Обновление популярности рецептов для сортировок popular и trending'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=60,
+            help='Пауза между обновлениями (секунды)',
+        )
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Обновить один раз и завершиться',
+        )
+        parser.add_argument(
+            '--rebuild',
+            action='store_true',
+            help='Пересчитать все рейтинги заново',
+        )
+
+    def handle(self, *args, **options):
+        rebuild = options['rebuild']
+        while True:
+            changed = refresh_rankings(rebuild=rebuild)
+            rebuild = False
+            if changed:
+                self.stdout.write(f'Обновлено рейтингов: {changed}')
+            if options['once']:
+                return
+            time.sleep(options['interval'])
@@ -0,0 +1,23 @@
+# Generated by Django 3.2.19 on 2026-10-18 19:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0011_feedentry'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='recipe',
+            name='image_attempts',
+            field=models.PositiveSmallIntegerField(default=0, verbose_name='Попыток обработки изображения'),
+        ),
+        migrations.AddField(
+            model_name='recipe',
+            name='image_claimed_at',
+            field=models.DateTimeField(blank=True, null=True, verbose_name='Изображение взято в обработку'),
+        ),
+    ]
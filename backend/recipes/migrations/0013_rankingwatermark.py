@@ -0,0 +1,24 @@
+# Generated by Django 3.2.19 on 2026-10-18 19:51
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0012_recipe_image_claim'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RankingWatermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('until', models.DateTimeField(verbose_name='Добавления учтены до')),
+            ],
+            options={
+                'verbose_name': 'Отметка пересчёта популярности',
+                'verbose_name_plural': 'Отметки пересчёта популярности',
+            },
+        ),
+    ]
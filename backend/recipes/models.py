@@ -1,8 +1,17 @@
-from django.db import models
+from django.contrib.postgres.aggregates import StringAgg
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVector, SearchVectorField)
+from django.db import connection, models
+from django.db.models import (Case, Exists, F, OuterRef, Prefetch, Q,
+                              Subquery, Value, When, Window)
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce, RowNumber
+from django.core.exceptions import EmptyResultSet
 from django.core.validators import (MaxValueValidator,
                                     MinValueValidator,)
 
-from users.models import User
+from foodgram.settings import SEARCH_CONFIG
+from users.models import Subscribe, User
 
 
 class Tag(models.Model):
@@ -30,6 +39,110 @@ class Tag(models.Model):
         return self.name
 
 
+class RecipeQuerySet(models.QuerySet):
+    def with_related(self):
+        """Автор, теги и ингредиенты рецептов фиксированным
+        числом запросов."""
+        return self.select_related('author').prefetch_related(
+            'tags',
+            Prefetch(
+                'recipes',
+                queryset=RecipeIngredient.objects.select_related(
+                    'ingredient'
+                )
+            ),
+        )
+
+    def with_user_flags(self, user):
+        """Флаги is_favorited, is_in_shopping_cart и подписки
+        на автора для пользователя одним запросом."""
+        if not user.is_authenticated:
+            return self.annotate(
+                is_favorited=Value(False, models.BooleanField()),
+                is_in_shopping_cart=Value(False, models.BooleanField()),
+                author_is_subscribed=Value(False, models.BooleanField()),
+            )
+        return self.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            author_is_subscribed=Exists(Subscribe.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        )
+
+    def limit_per_author(self, limit):
+        """Не больше limit рецептов каждого автора
+        через ROW_NUMBER() OVER (PARTITION BY author)."""
+        ranked = self.annotate(author_rank=Window(
+            expression=RowNumber(),
+            partition_by=F('author'),
+            order_by=[F('name').asc(), F('id').asc()],
+        )).values('id', 'author_rank')
+        try:
+            sql, params = ranked.query.sql_with_params()
+        except EmptyResultSet:
+            return self.none()
+        return self.filter(id__in=RawSQL(
+            f'SELECT ranked.id FROM ({sql}) ranked '
+            'WHERE ranked.author_rank <= %s',
+            (*params, limit)
+        ))
+
+    def with_ranking(self):
+        """Рецепты с popular_score и trending_score из RecipeRanking."""
+        return self.filter(ranking__isnull=False).annotate(
+            popular_score=F('ranking__popular_score'),
+            trending_score=F('ranking__trending_score'),
+        )
+
+    def search(self, text):
+        """Рецепты, подходящие под запрос, с релевантностью search_rank.
+
+        В PostgreSQL ищет по search_vector, иначе по вхождению
+        подстроки в название, описание и ингредиенты.
+        """
+        if connection.vendor != 'postgresql':
+            return self.filter(
+                Q(name__icontains=text)
+                | Q(text__icontains=text)
+                | Q(Exists(RecipeIngredient.objects.filter(
+                    recipe=OuterRef('pk'), ingredient__name__icontains=text
+                )))
+            ).annotate(search_rank=Case(
+                When(name__icontains=text, then=Value(1.0)),
+                default=Value(0.5),
+                output_field=models.FloatField(),
+            ))
+        query = SearchQuery(text, config=SEARCH_CONFIG,
+                            search_type='websearch')
+        return self.filter(search_vector=query).annotate(
+            search_rank=SearchRank(F('search_vector'), query)
+        )
+
+    def update_search_vector(self):
+        """Пересчитывает search_vector из названия, описания
+        и ингредиентов. Нужен только в PostgreSQL."""
+        if connection.vendor != 'postgresql':
+            return 0
+        ingredient_names = RecipeIngredient.objects.filter(
+            recipe=OuterRef('pk')
+        ).values('recipe').annotate(
+            names=StringAgg('ingredient__name', ' ')
+        ).values('names')
+        return self.update(search_vector=(
+            SearchVector('name', weight='A', config=SEARCH_CONFIG)
+            + SearchVector('text', weight='B', config=SEARCH_CONFIG)
+            + SearchVector(
+                Coalesce(Subquery(ingredient_names), Value('')),
+                weight='C', config=SEARCH_CONFIG,
+            )
+        ))
+
+
 class Recipe(models.Model):
     name = models.CharField(
         max_length=200,
@@ -63,15 +176,64 @@ class Recipe(models.Model):
         upload_to='recipes/',
         verbose_name='Изображение',
     )
+    image_variants = models.JSONField(
+        default=dict,
+        blank=True,
+        verbose_name='Уменьшенные копии изображения',
+    )
+    image_processed = models.BooleanField(
+        default=False,
+        verbose_name='Копии изображения готовы',
+    )
+    image_claimed_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Изображение взято в обработку',
+    )
+    image_attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток обработки изображения',
+    )
     ingredients = models.ManyToManyField(
         'Ingredient',
         through='RecipeIngredient',
         through_fields=('recipe', 'ingredient'),
         verbose_name='Ингредиенты',
     )
+    pub_date = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Дата публикации',
+    )
+    favorites_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В избранном',
+    )
+    shopping_carts_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='В списках покупок',
+    )
+    # GIN-индекс по search_vector создаётся миграцией только в PostgreSQL.
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('name',)
+        indexes = [
+            models.Index(fields=('-pub_date', '-id'),
+                         name='recipe_pub_date_id_idx'),
+            models.Index(fields=('name', 'id'),
+                         name='recipe_name_id_idx'),
+            models.Index(fields=('cooking_time', 'id'),
+                         name='recipe_cooking_time_id_idx'),
+            models.Index(fields=('id',),
+                         condition=models.Q(image_processed=False),
+                         name='recipe_image_pending_idx'),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         default_related_name = 'recipes'
@@ -148,6 +310,11 @@ class AbstractFavoriteShoppingCart(models.Model):
         Recipe,
         on_delete=models.CASCADE,
     )
+    created = models.DateTimeField(
+        auto_now_add=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         abstract = True
@@ -174,3 +341,166 @@ class ShoppingCart(AbstractFavoriteShoppingCart):
     class Meta(AbstractFavoriteShoppingCart.Meta):
         verbose_name = 'Список покупок'
         verbose_name_plural = 'Списки покупок'
+
+
+class ShoppingCartIngredient(models.Model):
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_ingredients',
+        verbose_name='Пользователь',
+    )
+    ingredient = models.ForeignKey(
+        Ingredient,
+        on_delete=models.CASCADE,
+        related_name='shopping_cart_totals',
+        verbose_name='Ингредиент',
+    )
+    amount = models.PositiveIntegerField(
+        verbose_name='Количество',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'ingredient'),
+                name='unique_shopping_cart_ingredient',
+            )
+        ]
+        verbose_name = 'Ингредиент списка покупок'
+        verbose_name_plural = 'Ингредиенты списков покупок'
+
+    def __str__(self):
+        return f'{self.user} - {self.ingredient} {self.amount}'
+
+
+class RecipeRanking(models.Model):
+    """Популярность рецепта для сортировок popular и trending.
+
+    trending_score хранит log2 суммы 2 ** ((created - TRENDING_EPOCH) /
+    TRENDING_HALF_LIFE) по добавлениям в избранное и покупки: порядок
+    такой же, как у суммы с затуханием, но значение меняется только
+    при новых или удалённых добавлениях.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='ranking',
+        verbose_name='Рецепт',
+    )
+    popular_score = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Добавлений в избранное и покупки',
+    )
+    trending_score = models.FloatField(
+        default=0,
+        verbose_name='Популярность с затуханием',
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=('-popular_score', '-recipe'),
+                         name='ranking_popular_idx'),
+            models.Index(fields=('-trending_score', '-recipe'),
+                         name='ranking_trending_idx'),
+        ]
+        verbose_name = 'Популярность рецепта'
+        verbose_name_plural = 'Популярность рецептов'
+
+    def __str__(self):
+        return f'{self.recipe} {self.popular_score}'
+
+
+class RankingWatermark(models.Model):
+    """Момент, до которого (включительно) добавления учтены
+    в RecipeRanking. Единственная строка с pk=1."""
+    until = models.DateTimeField(
+        verbose_name='Добавления учтены до',
+    )
+
+    class Meta:
+        verbose_name = 'Отметка пересчёта популярности'
+        verbose_name_plural = 'Отметки пересчёта популярности'
+
+    def __str__(self):
+        return f'{self.until}'
+
+
+class FeedEntry(models.Model):
+    """Рецепт в ленте подписчика; заполняется при публикации."""
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор рецепта',
+    )
+    pub_date = models.DateTimeField(
+        verbose_name='Дата публикации',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('user', 'recipe'),
+                name='unique_feed_entry',
+            )
+        ]
+        indexes = [
+            models.Index(fields=('user', '-pub_date', '-recipe'),
+                         name='feed_user_pub_date_idx'),
+            models.Index(fields=('user', 'author'),
+                         name='feed_user_author_idx'),
+        ]
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Записи ленты'
+
+    def __str__(self):
+        return f'{self.user} - {self.recipe}'
+
+
+class RecipeNeighbour(models.Model):
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='neighbours',
+        verbose_name='Рецепт',
+    )
+    neighbour = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField(
+        verbose_name='Сходство',
+    )
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=('recipe', 'neighbour'),
+                name='unique_recipe_neighbour',
+            )
+        ]
+        indexes = [
+            models.Index(fields=('recipe', '-score'),
+                         name='recipe_neighbour_score_idx'),
+        ]
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.neighbour} {self.score:.2f}'
@@ -0,0 +1,114 @@
+import math
+from collections import defaultdict
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from foodgram.settings import TRENDING_HALF_LIFE_DAYS
+from recipes.cache import RANKINGS, invalidate
+from recipes.models import (Favorite, RankingWatermark, Recipe, RecipeRanking,
+                            ShoppingCart)
+
+INTERACTIONS = (Favorite, ShoppingCart)
+SCORE_FIELDS = ('popular_score', 'trending_score')
+# При смене TRENDING_HALF_LIFE_DAYS нужен пересчёт с --rebuild.
+TRENDING_EPOCH = datetime(2020, 1, 1, tzinfo=dt_timezone.utc)
+TRENDING_HALF_LIFE = timedelta(days=TRENDING_HALF_LIFE_DAYS)
+WATERMARK_ID = 1
+
+
+def log2_sum(exponents):
+    """log2(sum(2 ** x)) без переполнения."""
+    top = max(exponents)
+    return top + math.log2(sum(2 ** (x - top) for x in exponents))
+
+
+def interactions(**filters):
+    """Показатели 2 ** x добавлений, подходящих под filters:
+    {recipe_id: [x, ...]}."""
+    exponents = defaultdict(list)
+    for model in INTERACTIONS:
+        rows = model.objects.filter(**filters).values_list(
+            'recipe_id', 'created'
+        ).order_by()
+        for recipe_id, created in rows.iterator(chunk_size=5000):
+            exponents[recipe_id].append(
+                (created - TRENDING_EPOCH) / TRENDING_HALF_LIFE
+            )
+    return exponents
+
+
+def recompute(rankings, until, **filters):
+    """Пересчитывает рейтинги rankings по всем добавлениям
+    не позже until."""
+    exponents = interactions(created__lte=until, **filters)
+    for ranking in rankings:
+        found = exponents.get(ranking.recipe_id, ())
+        ranking.popular_score = len(found)
+        ranking.trending_score = log2_sum(found) if found else 0
+    return rankings
+
+
+def add_new(since, until):
+    """Прибавляет к рейтингам добавления из (since, until]."""
+    exponents = interactions(created__gt=since, created__lte=until)
+    rankings = RecipeRanking.objects.select_for_update().in_bulk(exponents)
+    for recipe_id, ranking in rankings.items():
+        found = exponents[recipe_id]
+        ranking.trending_score = log2_sum(
+            [*found, ranking.trending_score] if ranking.popular_score
+            else found
+        )
+        ranking.popular_score += len(found)
+    return list(rankings.values())
+
+
+@transaction.atomic
+def refresh_rankings(rebuild=False):
+    """Обновляет RecipeRanking и возвращает число изменённых строк.
+
+    Новые добавления прибавляются к рейтингу. Рецепты, у которых
+    число учтённых добавлений разошлось со счётчиками (удаления,
+    поздно зафиксированные вставки), пересчитываются целиком.
+    Без сохранённой отметки времени пересчитывается всё. Строка
+    отметки блокируется, поэтому параллельные пересчёты идут по очереди.
+    """
+    watermark = RankingWatermark.objects.select_for_update().filter(
+        pk=WATERMARK_ID
+    ).first()
+    until = timezone.now()
+    since = None if rebuild or watermark is None else watermark.until
+    missing = Recipe.objects.filter(
+        ranking__isnull=True
+    ).values_list('id', flat=True)
+    RecipeRanking.objects.bulk_create(
+        (RecipeRanking(recipe_id=recipe_id) for recipe_id in missing),
+        ignore_conflicts=True
+    )
+    added = []
+    if since is None:
+        changed = recompute(
+            list(RecipeRanking.objects.select_for_update()), until
+        )
+    else:
+        added = add_new(since, until)
+        RecipeRanking.objects.bulk_update(added, SCORE_FIELDS,
+                                          batch_size=1000)
+        drifted = list(RecipeRanking.objects.select_for_update().exclude(
+            popular_score=(F('recipe__favorites_count')
+                           + F('recipe__shopping_carts_count'))
+        ))
+        changed = recompute(
+            drifted, until,
+            recipe_id__in=[ranking.recipe_id for ranking in drifted]
+        )
+    RecipeRanking.objects.bulk_update(changed, SCORE_FIELDS,
+                                      batch_size=1000)
+    RankingWatermark.objects.update_or_create(
+        pk=WATERMARK_ID, defaults={'until': until}
+    )
+    if added or changed:
+        invalidate((RANKINGS,))
+    return len(added) + len(changed)
@@ -0,0 +1,152 @@
+import threading
+from array import array
+from collections import Counter, defaultdict
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Count, OuterRef, Subquery
+
+from foodgram.settings import REFERENCE_CACHE_TIMEOUT
+from recipes.cache import bump_version, get_version
+from recipes.models import RecipeIngredient
+
+NAMESPACE = RecipeIngredient._meta.label_lower
+# id рецептов — BigAutoField, 64-битные знаковые.
+RECIPE_IDS = 'q'
+
+
+def change_key(version):
+    return f'{NAMESPACE}:change:{version}'
+
+
+def _postings(rows):
+    postings = defaultdict(list)
+    for recipe_id, ingredient_id in rows:
+        postings[ingredient_id].append(recipe_id)
+    return postings
+
+
+class RecipeIngredientIndex:
+    """Обратный индекс ингредиент -> рецепты в памяти процесса.
+
+    Для каждого ингредиента хранит отсортированный массив id рецептов.
+    Изменения рецептов записываются в кеш под новой версией, и другие
+    процессы применяют их к своему индексу без полной перестройки.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._version = None
+        self._entries = ({}, {})
+
+    def reset(self):
+        """Сбрасывает индекс: следующее обращение построит его
+        заново."""
+        with self._lock:
+            self._version = None
+            self._entries = ({}, {})
+
+    def _build(self, version):
+        rows = RecipeIngredient.objects.values_list(
+            'recipe_id', 'ingredient_id'
+        ).order_by('recipe_id')
+        recipes = defaultdict(list)
+        for recipe_id, ingredient_id in rows.iterator(chunk_size=5000):
+            recipes[recipe_id].append(ingredient_id)
+        recipes = {recipe_id: tuple(ingredient_ids)
+                   for recipe_id, ingredient_ids in recipes.items()}
+        ingredients = {
+            ingredient_id: array(RECIPE_IDS, recipe_ids)
+            for ingredient_id, recipe_ids in _postings(
+                (recipe_id, ingredient_id)
+                for recipe_id, ingredient_ids in recipes.items()
+                for ingredient_id in ingredient_ids
+            ).items()
+        }
+        self._entries = (recipes, ingredients)
+        self._version = version
+
+    def _apply(self, recipe_ids, version):
+        """Заменяет ингредиенты рецептов recipe_ids на текущие из базы.
+        Затронутые массивы пересоздаются, а не меняются на месте."""
+        rows = list(RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).values_list('recipe_id', 'ingredient_id'))
+        recipes, ingredients = map(dict, self._entries)
+        touched = set()
+        for recipe_id in recipe_ids:
+            touched.update(recipes.pop(recipe_id, ()))
+        added = _postings(rows)
+        touched.update(added)
+        for recipe_id, ingredient_id in rows:
+            recipes[recipe_id] = recipes.get(recipe_id, ()) + (ingredient_id,)
+        for ingredient_id in touched:
+            kept = set(ingredients.get(ingredient_id, ())) - set(recipe_ids)
+            kept.update(added.get(ingredient_id, ()))
+            if kept:
+                ingredients[ingredient_id] = array(RECIPE_IDS, sorted(kept))
+            else:
+                ingredients.pop(ingredient_id, None)
+        self._entries = (recipes, ingredients)
+        self._version = version
+
+    def _sync(self, version):
+        changes = {}
+        if self._version is not None and version > self._version:
+            changes = cache.get_many([
+                change_key(number)
+                for number in range(self._version + 1, version + 1)
+            ])
+        if changes and len(changes) == version - self._version:
+            self._apply(set().union(*changes.values()), version)
+        else:
+            self._build(version)
+
+    def _ensure_synced(self):
+        version = get_version(NAMESPACE)
+        if version != self._version:
+            with self._lock:
+                if version != self._version:
+                    self._sync(version)
+
+    def recipes_changed(self, recipe_ids):
+        """Записывает изменение ингредиентов рецептов для всех
+        процессов. Вызывается после фиксации транзакции."""
+        version = bump_version(NAMESPACE)
+        cache.set(change_key(version), frozenset(recipe_ids),
+                  timeout=REFERENCE_CACHE_TIMEOUT)
+
+    def coverage(self, ingredient_ids):
+        """Доля ингредиентов каждого рецепта, которая есть среди
+        ingredient_ids: {recipe_id: (найдено, всего)} для рецептов
+        хотя бы с одним совпадением."""
+        self._ensure_synced()
+        recipes, ingredients = self._entries
+        hits = Counter()
+        for ingredient_id in set(ingredient_ids):
+            hits.update(ingredients.get(ingredient_id, ()))
+        return {recipe_id: (found, len(recipes[recipe_id]))
+                for recipe_id, found in hits.items()}
+
+
+def sql_coverage(ingredient_ids):
+    """То же, что RecipeIngredientIndex.coverage, одним GROUP BY
+    по RecipeIngredient."""
+    totals = RecipeIngredient.objects.filter(
+        recipe=OuterRef('recipe')
+    ).values('recipe').annotate(total=Count('id')).values('total')
+    rows = RecipeIngredient.objects.filter(
+        ingredient_id__in=ingredient_ids
+    ).values('recipe').annotate(
+        found=Count('id'), total=Subquery(totals)
+    ).values_list('recipe', 'found', 'total').order_by()
+    return {recipe_id: (found, total) for recipe_id, found, total in rows}
+
+
+recipe_index = RecipeIngredientIndex()
+
+
+def notify_recipes_changed(recipe_ids):
+    """Обновляет индекс после фиксации текущей транзакции."""
+    recipe_ids = frozenset(recipe_ids)
+    transaction.on_commit(lambda: recipe_index.recipes_changed(recipe_ids))
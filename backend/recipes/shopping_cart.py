@@ -0,0 +1,204 @@
+import csv
+import json
+
+from collections import Counter
+
+from django.db import connection, transaction
+from django.db.models import F, Sum
+
+from recipes.models import (RecipeIngredient, ShoppingCart,
+                            ShoppingCartIngredient)
+
+CHUNK_SIZE = 500
+
+
+def shopping_cart_ingredients(user):
+    """Суммарное количество каждого ингредиента из корзины покупок."""
+    return (ShoppingCartIngredient.objects
+            .filter(user=user)
+            .values(name=F('ingredient__name'),
+                    unit=F('ingredient__measurement_unit'))
+            .annotate(amount_sum=Sum('amount'))
+            .order_by('name'))
+
+
+def expected_cart_totals(user_ids=None):
+    """Количества ингредиентов корзин, пересчитанные
+    по RecipeIngredient: {(user_id, ingredient_id): amount}.
+    Нулевых итогов нет, как и после apply_cart_deltas."""
+    carts = ShoppingCart.objects.all()
+    if user_ids is not None:
+        carts = carts.filter(user_id__in=user_ids)
+    rows = (RecipeIngredient.objects
+            .filter(recipe__shoppingcart_recipe__in=carts)
+            .values_list('recipe__shoppingcart_recipe__user',
+                         'ingredient')
+            .annotate(total=Sum('amount'))
+            .filter(total__gt=0)
+            .order_by())
+    return {(user_id, ingredient_id): total
+            for user_id, ingredient_id, total in rows}
+
+
+def _locked_cart_rows(keys):
+    user_ids = {user_id for user_id, _ in keys}
+    ingredient_ids = {ingredient_id for _, ingredient_id in keys}
+    return {
+        (row.user_id, row.ingredient_id): row
+        for row in ShoppingCartIngredient.objects.select_for_update()
+        .filter(user_id__in=user_ids, ingredient_id__in=ingredient_ids)
+        if (row.user_id, row.ingredient_id) in keys
+    }
+
+
+def _add_cart_amounts(deltas):
+    """Прибавляет положительные изменения одним
+    INSERT ... ON CONFLICT DO UPDATE."""
+    meta = ShoppingCartIngredient._meta
+    quote = connection.ops.quote_name
+    columns = [quote(meta.get_field(name).column)
+               for name in ('user', 'ingredient', 'amount')]
+    user_ids, ingredient_ids, amounts = zip(*(
+        (user_id, ingredient_id, delta)
+        for (user_id, ingredient_id), delta in sorted(deltas.items())
+    ))
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'INSERT INTO {quote(meta.db_table)} AS cart '
+            f'({", ".join(columns)}) '
+            'SELECT * FROM unnest(%s::bigint[], %s::bigint[], '
+            '%s::integer[]) '
+            f'ON CONFLICT ({columns[0]}, {columns[1]}) DO UPDATE '
+            f'SET {columns[2]} = cart.{columns[2]} + '
+            f'EXCLUDED.{columns[2]}',
+            (list(user_ids), list(ingredient_ids), list(amounts))
+        )
+
+
+@transaction.atomic
+def apply_cart_deltas(deltas):
+    """Применяет изменения {(user_id, ingredient_id): delta}
+    к ShoppingCartIngredient.
+
+    Строку, которую параллельно вставила другая транзакция, изменение
+    дополняет, а не падает на уникальности: в PostgreSQL положительные
+    изменения прибавляются через ON CONFLICT DO UPDATE, в других базах
+    недостающие строки сначала вставляются с нулём и ignore_conflicts.
+    """
+    deltas = {key: delta for key, delta in deltas.items() if delta}
+    if connection.vendor == 'postgresql':
+        added = {key: delta for key, delta in deltas.items() if delta > 0}
+        if added:
+            _add_cart_amounts(added)
+        deltas = {key: delta for key, delta in deltas.items() if delta < 0}
+    if not deltas:
+        return
+    existing = _locked_cart_rows(deltas.keys())
+    missing = {key for key, delta in deltas.items()
+               if delta > 0 and key not in existing}
+    if missing:
+        ShoppingCartIngredient.objects.bulk_create(
+            (ShoppingCartIngredient(user_id=user_id,
+                                    ingredient_id=ingredient_id, amount=0)
+             for user_id, ingredient_id in missing),
+            ignore_conflicts=True
+        )
+        existing.update(_locked_cart_rows(missing))
+    to_update, to_delete = [], []
+    for key, delta in deltas.items():
+        row = existing.get(key)
+        if row is None:
+            continue
+        row.amount += delta
+        if row.amount > 0:
+            to_update.append(row)
+        else:
+            to_delete.append(row.id)
+    ShoppingCartIngredient.objects.bulk_update(to_update, ('amount',))
+    ShoppingCartIngredient.objects.filter(id__in=to_delete).delete()
+
+
+def add_recipes_to_totals(user_id, recipe_ids, sign=1):
+    amounts = (RecipeIngredient.objects
+               .filter(recipe_id__in=recipe_ids)
+               .values_list('ingredient')
+               .annotate(total=Sum('amount'))
+               .order_by())
+    apply_cart_deltas({
+        (user_id, ingredient_id): sign * total
+        for ingredient_id, total in amounts
+    })
+
+
+def add_recipe_to_totals(user_id, recipe_id):
+    add_recipes_to_totals(user_id, (recipe_id,))
+
+
+def remove_recipe_from_totals(user_id, recipe_id):
+    add_recipes_to_totals(user_id, (recipe_id,), sign=-1)
+
+
+def update_recipe_in_totals(recipe, old_amounts, new_amounts):
+    """Переносит изменение ингредиентов рецепта
+    {ingredient_id: amount} в корзины, где он лежит."""
+    difference = Counter(new_amounts)
+    difference.subtract(old_amounts)
+    difference = {key: delta for key, delta in difference.items() if delta}
+    if not difference:
+        return
+    user_ids = ShoppingCart.objects.filter(
+        recipe=recipe
+    ).values_list('user', flat=True)
+    apply_cart_deltas({
+        (user_id, ingredient_id): delta
+        for user_id in user_ids
+        for ingredient_id, delta in difference.items()
+    })
+
+
+class Echo:
+    """Буфер для csv.writer, который просто возвращает строку."""
+    def write(self, value):
+        return value
+
+
+def render_txt(ingredients):
+    separator = ''
+    for ingredient in ingredients:
+        yield (f'{separator}{ingredient["name"]} - {ingredient["unit"]} '
+               f'{ingredient["amount_sum"]}')
+        separator = '\n'
+
+
+def render_csv(ingredients):
+    writer = csv.writer(Echo())
+    yield writer.writerow(('name', 'measurement_unit', 'amount'))
+    for ingredient in ingredients:
+        yield writer.writerow((ingredient['name'],
+                               ingredient['unit'],
+                               ingredient['amount_sum']))
+
+
+def render_json(ingredients):
+    yield '['
+    for index, ingredient in enumerate(ingredients):
+        yield (',' if index else '') + json.dumps({
+            'name': ingredient['name'],
+            'measurement_unit': ingredient['unit'],
+            'amount': ingredient['amount_sum'],
+        }, ensure_ascii=False)
+    yield ']'
+
+
+EXPORTERS = {
+    'txt': render_txt,
+    'csv': render_csv,
+    'json': render_json,
+}
+
+
+def export_shopping_cart(user, export_format):
+    ingredients = shopping_cart_ingredients(user).iterator(
+        chunk_size=CHUNK_SIZE
+    )
+    return EXPORTERS[export_format](ingredients)
@@ -0,0 +1,99 @@
+import numpy as np
+from django.db import transaction
+from scipy import sparse
+
+from recipes.models import Recipe, RecipeIngredient, RecipeNeighbour
+
+METRICS = ('jaccard', 'cosine')
+# Сколько ячеек плотного блока сходства считать за раз (float32).
+BLOCK_CELLS = 2 ** 25
+
+
+def feature_matrix():
+    """Разреженная бинарная матрица рецепт x (ингредиенты + теги)
+    и массив id рецептов, соответствующих её строкам."""
+    recipe_ids = np.fromiter(
+        Recipe.objects.order_by('id').values_list('id', flat=True),
+        dtype=np.int64
+    )
+    ingredients = np.array(
+        RecipeIngredient.objects.values_list('recipe_id', 'ingredient_id'),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    tags = np.array(
+        Recipe.tags.through.objects.values_list('recipe_id', 'tag_id'),
+        dtype=np.int64
+    ).reshape(-1, 2)
+    ingredient_columns = np.unique(ingredients[:, 1], return_inverse=True)[1]
+    tag_columns = np.unique(tags[:, 1], return_inverse=True)[1]
+    rows = np.searchsorted(
+        recipe_ids, np.concatenate((ingredients[:, 0], tags[:, 0]))
+    )
+    columns = np.concatenate((
+        ingredient_columns.ravel(),
+        tag_columns.ravel() + (ingredient_columns.max(initial=-1) + 1),
+    ))
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (rows, columns)),
+        shape=(len(recipe_ids), columns.max(initial=-1) + 1),
+    )
+    matrix.data[:] = 1
+    return matrix, recipe_ids
+
+
+def top_neighbours(matrix, k, metric='jaccard', batch_size=None):
+    """Для блоков строк возвращает (строки, соседи, сходство):
+    до k самых похожих рецептов каждой строки с ненулевым сходством.
+
+    Пересечения блока со всеми рецептами считаются произведением
+    разреженной матрицы на плотный блок: у популярных ингредиентов
+    результат почти плотный, и так быстрее, чем разреженный.
+    """
+    count = matrix.shape[0]
+    sizes = np.asarray(matrix.sum(axis=1), dtype=np.float32).ravel()
+    batch_size = batch_size or max(1, BLOCK_CELLS // max(count, 1))
+    k = min(k, count - 1)
+    if k <= 0:
+        return
+    for start in range(0, count, batch_size):
+        stop = min(start + batch_size, count)
+        common = np.ascontiguousarray(
+            (matrix @ matrix[start:stop].T.toarray()).T
+        )
+        if metric == 'cosine':
+            scores = np.sqrt(np.multiply.outer(sizes[start:stop], sizes))
+        else:
+            scores = np.add.outer(sizes[start:stop], sizes)
+            scores -= common
+        np.maximum(scores, 1, out=scores)
+        np.divide(common, scores, out=scores)
+        batch = np.arange(stop - start)
+        scores[batch, batch + start] = 0
+        neighbours = np.argpartition(scores, count - k, axis=1)[:, -k:]
+        best = np.take_along_axis(scores, neighbours, axis=1)
+        rows = np.repeat(batch + start, k)
+        neighbours, best = neighbours.ravel(), best.ravel()
+        found = best > 0
+        yield rows[found], neighbours[found], best[found]
+
+
+@transaction.atomic
+def rebuild_neighbours(k, metric='jaccard', batch_size=None):
+    """Пересчитывает таблицу похожих рецептов целиком.
+    Возвращает число сохранённых пар."""
+    matrix, recipe_ids = feature_matrix()
+    RecipeNeighbour.objects.all().delete()
+    saved = 0
+    for rows, neighbours, scores in top_neighbours(matrix, k, metric,
+                                                   batch_size):
+        pairs = zip(recipe_ids[rows].tolist(),
+                    recipe_ids[neighbours].tolist(),
+                    scores.tolist())
+        RecipeNeighbour.objects.bulk_create(
+            (RecipeNeighbour(recipe_id=recipe_id, neighbour_id=neighbour_id,
+                             score=score)
+             for recipe_id, neighbour_id, score in pairs),
+            batch_size=5000
+        )
+        saved += len(rows)
+    return saved
@@ -25,6 +25,17 @@ class User(AbstractUser):
         max_length=150,
         verbose_name='Пароль'
     )
+    recipes_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Рецептов',
+    )
+    subscribers_count = models.PositiveIntegerField(
+        default=0,
+        verbose_name='Подписчиков',
+    )
+
+    # Меняются UPDATE в обход модели, см. api.signals.COUNTERS.
+    COUNTER_FIELDS = ('recipes_count', 'subscribers_count')
 
     class Meta:
         ordering = ('username',)